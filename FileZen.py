@@ -1,15 +1,27 @@
 # filezen.py
 import os
-import shutil
+import re
+import sys
 import json
+import stat
+import time
+import asyncio
+import threading
 import joblib
-import subprocess
 import pandas as pd
 from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 
+from filezen_async import organize_async, uses_async_io
+from filezen_dedup import DedupService
+from filezen_io import MoveEngine, throttle_from_config, lower_priority
+from filezen_metadata import MetadataExtractor, render_path, valid_templates
+from filezen_metrics import Metrics, NULL_METRICS
+
 # ======== DEFAULT CATEGORIES ========
 DEFAULT_DIRECTORIES = {
     "HTML": [".html5", ".html", ".htm", ".xhtml"],
@@ -27,14 +39,34 @@ DEFAULT_DIRECTORIES = {
 CONFIG_FILE = "file_tidy_config.json"
 LOG_FILE = "file_tidy_log.json"
 UNDO_FILE = "file_tidy_undo.json"
-REVIEW_LOG = "file_tidy_review.json"
+REVIEW_LOG = "file_tidy_review.json"  # JSON lines (older versions wrote one JSON array)
+INDEX_FILE = "file_tidy_index.json"
 MODEL_FILE = "filezen_model.pkl"
 
 # ======== CONFIG ========
 DEFAULT_CONFIG = {
     "confidence_threshold": 0.75,
     "review_folder_name": "REVIEW",
-    "model_file": MODEL_FILE
+    "duplicates_folder_name": "Duplicate_Files",
+    "dedup_on_collision": "off",
+    "path_templates": {},
+    "mount_concurrency": {},
+    "prediction_cache": False,
+    "prediction_cache_entries": 50000,
+    "prediction_cache_file": None,
+    "model_file": MODEL_FILE,
+    "incremental": False,
+    "verify_moves": False,
+    "dedup_warm_after_organize": True,
+    "io_bytes_per_s": None,
+    "io_files_per_s": None,
+    "io_adaptive": False,
+    "io_target_latency_ms": 50,
+    "io_drop_cache": False,
+    "io_nice": None,
+    "io_idle_priority": False,
+    "metrics_file": None,
+    "profile_file": None
 }
 
 def load_config():
@@ -51,18 +83,140 @@ config = load_config()
 
 # ======== LOAD MODEL ========
 ml_model = None
-if os.path.exists(config["model_file"]):
+model_stamp = None  # (mtime_ns, size) of the loaded model file
+_model_missing = False  # reported "no model" already
+
+def reload_model(force=False):
+    """Load ``model_file`` if it changed on disk since the last load; return the model.
+
+    A model that fails to load leaves the previous one in place.
+    """
+    global ml_model, model_stamp, _model_missing
+    path = config["model_file"]
+    if not os.path.exists(path):
+        if not _model_missing:
+            print("[INFO] No model found. Running rule-based only.")
+        ml_model, model_stamp, _model_missing = None, None, True
+        return None
+    _model_missing = False
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    if stamp == model_stamp and not force:
+        return ml_model
     try:
-        ml_model = joblib.load(config["model_file"])
-        print("[INFO] Loaded ML model:", config["model_file"])
+        ml_model = joblib.load(path)
+        model_stamp = stamp
+        print("[INFO] Loaded ML model:", path)
     except Exception as e:
         print("[WARN] Failed to load model:", e)
-else:
-    print("[INFO] No model found. Running rule-based only.")
+    return ml_model
+
+reload_model()
+
+# ======== PREDICTION CACHE ========
+_DIGIT_RUNS = re.compile(r"\d+")
+
+def prediction_key(file_path: Path, size):
+    """Normalized features: extension, name with digit runs as '#', log2 size bucket.
+
+    ``backup_2023_01.bak`` and ``backup_2024_11.bak`` of similar size share a key.
+    """
+    return (file_path.suffix.lower(), _DIGIT_RUNS.sub("#", file_path.stem.lower()),
+            int(size + 1).bit_length() - 1)
+
+class PredictionCache:
+    """Bounded LRU of model predictions, valid for one version of the model file.
+
+    Entries are dropped as soon as the model stamp (mtime_ns, size) changes;
+    with ``path`` they are kept between runs as JSON.
+    """
+    def __init__(self, max_entries, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.entries = OrderedDict()
+        self.stamp = None
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False  # changed since the last load/save
+        self.lock = threading.Lock()
+
+    def get(self, key, stamp):
+        with self.lock:
+            if stamp != self.stamp:
+                self.entries.clear()
+                self.stamp = stamp
+                self.dirty = True
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, stamp):
+        with self.lock:
+            if stamp != self.stamp:
+                return
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            self.dirty = True
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+    def load(self, stamp):
+        if not self.path or stamp is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except Exception as e:
+            print("[WARN] Ignoring prediction cache:", e)
+            return
+        if tuple(data.get("model") or ()) != stamp:
+            return  # written for another model
+        with self.lock:
+            self.stamp = stamp
+            for ext, signature, bucket, category, conf in data.get("entries", [])[-self.max_entries:]:
+                self.entries[(ext, signature, bucket)] = (category, conf)
+
+    def save(self):
+        """Write the cache to ``path`` if anything changed since it was read or written."""
+        if not self.path or self.stamp is None or not self.dirty:
+            return
+        with self.lock:
+            self.dirty = False
+            data = {"model": list(self.stamp),
+                    "entries": [[*key, str(category), conf] for key, (category, conf) in self.entries.items()]}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+prediction_cache = None
+if config["prediction_cache"]:
+    prediction_cache = PredictionCache(config["prediction_cache_entries"], config["prediction_cache_file"])
+    prediction_cache.load(model_stamp)
+
+# Rate limits and the digest cache are shared by every mover/hasher in this
+# process, including the duplicate finder window.
+throttle = throttle_from_config(config)
+dedup_service = DedupService(throttle=throttle)
+mover = MoveEngine(verify=config["verify_moves"], throttle=throttle, service=dedup_service)
+metadata_extractor = MetadataExtractor()
+
+# How often Tk hands control to Qt while the duplicate finder is open.
+DUPLICATE_FINDER_PUMP_MS = 15
+# How often Tk checks whether a background organize/review run has finished.
+BACKGROUND_POLL_MS = 100
 
 # ======== UTIL ========
-def _unique_target(target_path: Path) -> Path:
-    if not target_path.exists():
+def _unique_target(target_path: Path, taken=()) -> Path:
+    """First free name for ``target_path``; names in ``taken`` count as used."""
+    if target_path not in taken and not target_path.exists():
         return target_path
     base = target_path.stem
     suffix = target_path.suffix
@@ -70,37 +224,311 @@ def _unique_target(target_path: Path) -> Path:
     i = 1
     while True:
         candidate = parent / f"{base}_{i}{suffix}"
-        if not candidate.exists():
+        if candidate not in taken and not candidate.exists():
             return candidate
         i += 1
 
-def move_file_safe(src: Path, dest: Path):
-    dest = _unique_target(dest)
-    dest.parent.mkdir(parents=True, exist_ok=True)
-    shutil.move(str(src), str(dest))
+def start_move(src: Path, dest: Path, metrics=NULL_METRICS, digest=None):
+    """Pick a free name for ``dest`` and start moving ``src`` there.
+
+    Returns (final path, Future or None); a Future means a large
+    cross-device copy is still running on the mover's large-file lane.
+    """
+    with metrics.phase("probe"):
+        dest = _unique_target(dest)
+    with metrics.phase("mkdir"):
+        dest.parent.mkdir(parents=True, exist_ok=True)
+    with metrics.phase("move"):
+        pending = mover.move(src, dest, digest)
+    return dest, pending
+
+def move_file_safe(src: Path, dest: Path, metrics=NULL_METRICS, digest=None):
+    dest, pending = start_move(src, dest, metrics, digest)
+    if pending is not None:
+        pending.result()
     return dest
 
-def predict_category(file_path: Path):
+def collapse_duplicate(src: Path, dest: Path, directory, src_stat=None, metrics=NULL_METRICS,
+                       taken=()):
+    """Collapse ``src`` into ``dest`` if that name is taken by an identical file.
+
+    Size is compared first, then digests from ``dedup_service`` (cached, so
+    each file is read at most once). Depending on ``dedup_on_collision`` the
+    duplicate is moved to the duplicates folder ("move") or replaced by a
+    hardlink next to ``dest`` ("hardlink"), avoiding names in ``taken``.
+    Returns where ``src`` ended up, or None if it is not a duplicate and
+    should be moved as usual.
+    """
+    mode = config["dedup_on_collision"]
+    if mode not in ("move", "hardlink"):
+        return None
+    with metrics.phase("dedup"):
+        try:
+            dest_stat = dest.stat()
+        except OSError:
+            return None
+        src_stat = src_stat or src.stat()
+        if (not stat.S_ISREG(dest_stat.st_mode) or dest_stat.st_size != src_stat.st_size
+                or (dest_stat.st_dev, dest_stat.st_ino) == (src_stat.st_dev, src_stat.st_ino)):
+            return None
+        digest = dedup_service.digest(src, src_stat, metrics)
+        if dedup_service.digest(dest, dest_stat, metrics) != digest:
+            return None
+
+    if mode == "hardlink" and dest_stat.st_dev == src_stat.st_dev:
+        with metrics.phase("probe"):
+            link = _unique_target(dest, taken)
+        try:
+            os.link(dest, link)
+        except OSError as e:
+            print("[WARN] Cannot hardlink", link, "->", dest, e)
+        else:
+            os.remove(src)
+            return link
+    return move_file_safe(src, Path(directory) / config["duplicates_folder_name"] / src.name,
+                          metrics, digest)
+
+def predict_category(file_path: Path, size=None):
     if ml_model is None:
         return None, 0.0
+    if size is None:
+        size = file_path.stat().st_size
+    key = None
+    if prediction_cache is not None:
+        key = prediction_key(file_path, size)
+        cached = prediction_cache.get(key, model_stamp)
+        if cached is not None:
+            return cached
     data = pd.DataFrame([{
         "filename": file_path.name,
         "extension": file_path.suffix.lower(),
-        "size": file_path.stat().st_size
+        "size": size
     }])
     try:
         proba = ml_model.predict_proba(data)[0]
-        pred = ml_model.predict(data)[0]
-        conf = float(proba.max())
-        return pred, conf
+        best = proba.argmax()
+        result = ml_model.classes_[best], float(proba[best])
     except Exception as e:
         print("[ML ERROR]", e)
         return None, 0.0
+    if key is not None:
+        prediction_cache.put(key, result, model_stamp)
+    return result
+
+def _prediction_cache_summary(before):
+    """Hits/misses since ``before`` (a ``stats()`` snapshot); saves the cache if persisted and changed."""
+    after = prediction_cache.stats()
+    prediction_cache.save()
+    return {"hits": after["hits"] - before["hits"], "misses": after["misses"] - before["misses"],
+            "entries": after["entries"]}
+
+
+# ======== SNAPSHOT INDEX ========
+# Directory mtimes this close to "now" may still change within the same
+# timestamp tick, so they are not trusted for skipping a whole directory.
+INDEX_RACY_WINDOW_NS = 2_000_000_000
+
+def load_index():
+    if os.path.exists(INDEX_FILE):
+        try:
+            with open(INDEX_FILE) as f:
+                return json.load(f)
+        except Exception:
+            pass
+    return {}
+
+def _file_names(directory):
+    with os.scandir(directory) as it:
+        return {entry.name for entry in it if not entry.is_dir()}
+
+def _snapshot_mtime(directory, kept):
+    """(mtime_ns, racy) to store for ``directory`` after a run, or (None, False).
+
+    The mtime is read after our own moves and only kept if the files left in
+    the directory are exactly the ``kept`` ones (nothing arrived unseen). A
+    racy mtime (too close to now to be trusted on its own) makes the next
+    run compare the names again before skipping the directory.
+    """
+    mtime = os.stat(directory).st_mtime_ns
+    if _file_names(directory) != kept.keys() or os.stat(directory).st_mtime_ns != mtime:
+        return None, False
+    return mtime, time.time_ns() - mtime < INDEX_RACY_WINDOW_NS
+
+def save_index(index):
+    with open(INDEX_FILE, "w") as f:
+        json.dump(index, f)
+
+class _NamedEntry:
+    """Minimal ``os.DirEntry`` stand-in for files handed over by name."""
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = os.path.join(directory, name)
+        self._stat = None
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+    def stat(self):
+        if self._stat is None:  # cached like os.DirEntry.stat()
+            self._stat = os.stat(self.path)
+        return self._stat
+
+def _iter_entries(directory, files=None):
+    if files is None:
+        yield from os.scandir(directory)
+        return
+    for name in files:
+        entry = _NamedEntry(directory, name)
+        if os.path.isfile(entry.path):
+            yield entry
+
+def _entry_signature(entry):
+    st = entry.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+def _save_logs(files_moved, review_entries, reviewed=None):
+    """Append a move operation to the log and make it the undo operation.
+
+    ``reviewed`` maps review paths moved out of REVIEW to their review log
+    entries, so undoing the operation can put them back in the log.
+    """
+    if files_moved:
+        op = {"time": datetime.now().isoformat(), "moves": files_moved}
+        if reviewed:
+            op["reviewed"] = reviewed
+        data = []
+        if os.path.exists(LOG_FILE):
+            try:
+                data = json.load(open(LOG_FILE))
+            except:
+                pass
+        data.append(op)
+        with open(LOG_FILE, "w") as f:
+            json.dump(data, f, indent=2)
+        with open(UNDO_FILE, "w") as f:
+            json.dump(op, f, indent=2)
+
+    if review_entries:
+        _append_review_log({"original_path": k, **v} for k, v in review_entries.items())
+
+def _append_review_log(entries):
+    if _review_log_is_legacy():
+        _write_review_log(list(iter_review_log()))
+    with open(REVIEW_LOG, "a") as f:
+        for e in entries:
+            f.write(json.dumps(e) + "\n")
+
+def _review_log_is_legacy():
+    try:
+        with open(REVIEW_LOG) as f:
+            return f.read(64).lstrip().startswith("[")
+    except OSError:
+        return False
+
+def iter_review_log():
+    """Stream the entries of the review log (JSON lines or the older JSON array)."""
+    if not os.path.exists(REVIEW_LOG):
+        return
+    if _review_log_is_legacy():
+        try:
+            yield from json.load(open(REVIEW_LOG))
+        except ValueError:
+            pass
+        return
+    with open(REVIEW_LOG) as f:
+        for line in f:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # torn last line of an interrupted write
+
+def _write_review_log(entries):
+    tmp = REVIEW_LOG + ".tmp"
+    with open(tmp, "w") as f:
+        for e in entries:
+            f.write(json.dumps(e) + "\n")
+    os.replace(tmp, REVIEW_LOG)
 
 # ======== ORGANIZE FILES ========
-def organize_files(directory, dry_run=False, confidence_threshold=None):
+def _finish_summary(summary, cache_before, metrics):
+    """Add the prediction cache and metrics reports every organize run returns."""
+    if cache_before is not None:
+        summary["prediction_cache"] = _prediction_cache_summary(cache_before)
+    if metrics.enabled:
+        summary["metrics"] = metrics.to_dict()
+        if config["metrics_file"]:
+            metrics.write_json(config["metrics_file"])
+        if config["profile_file"]:
+            metrics.write_profile(config["profile_file"])
+    return summary
+
+def organize_files(directory, dry_run=False, confidence_threshold=None, incremental=None,
+                   files=None, metrics=None):
+    """Sort the files of ``directory`` into category folders.
+
+    With ``incremental`` (default: the ``incremental`` config key) a real run
+    consults the per-directory snapshot index: an unchanged directory is
+    skipped entirely and entries whose (name, size, mtime_ns) were already
+    seen are not classified again.
+
+    ``files`` restricts the run to the given names inside ``directory``
+    instead of scanning it (used by watch mode); the index is not consulted.
+
+    With ``dedup_on_collision`` set, a file whose name is already taken in
+    its category folder by an identical file is collapsed instead of being
+    moved under a new name (see ``collapse_duplicate``).
+
+    ``path_templates`` maps a category to a folder template filled from
+    file metadata, e.g. ``{"IMAGES": "IMAGES/{year}/{month}"}`` (fields:
+    year, month, day, author). Metadata of rule-routed files is read on a
+    thread pool a bounded window ahead of the file being moved.
+
+    With ``prediction_cache`` enabled, ``summary["prediction_cache"]`` reports
+    the model calls saved by the memo cache in this run.
+
+    ``metrics`` (a ``filezen_metrics.Metrics``) collects per-phase timings,
+    counters and per-file latencies into ``summary["metrics"]``. Setting the
+    ``metrics_file``/``profile_file`` config keys enables it for every run.
+
+    Directories on a mount listed in ``mount_concurrency`` (NFS/SMB) go
+    through the asyncio pipeline of ``filezen_async`` instead, unless the
+    run needs the index, ``files``, metrics or ``dedup_on_collision``.
+    """
+    if metrics is None:
+        if config["metrics_file"] or config["profile_file"]:
+            metrics = Metrics(profile=bool(config["profile_file"]))
+        else:
+            metrics = NULL_METRICS
     if confidence_threshold is None:
         confidence_threshold = config["confidence_threshold"]
+    if incremental is None:
+        incremental = config["incremental"]
+
+    reload_model()  # a retrained model takes effect (and resets the prediction cache) on the next run
+    cache_before = prediction_cache.stats() if prediction_cache is not None else None
+
+    if (not (incremental or files is not None or metrics.enabled)
+            and config["dedup_on_collision"] not in ("move", "hardlink")
+            and uses_async_io(directory, config)):
+        results, summary = asyncio.run(organize_async(directory, dry_run, confidence_threshold,
+                                                      host=sys.modules[__name__]))
+        return results, _finish_summary(summary, cache_before, metrics)
+
+    use_index = incremental and not dry_run and files is None
+    index_key = str(Path(directory).resolve())
+    seen = {}
+    kept = {}
+    if use_index:
+        with metrics.phase("index"):
+            index = load_index()
+        snapshot = index.get(index_key, {})
+        seen = snapshot.get("entries", {})
+        scan_mtime = os.stat(directory).st_mtime_ns
+        if snapshot.get("mtime_ns") == scan_mtime and (not snapshot.get("racy")
+                                                        or _file_names(directory) == seen.keys()):
+            summary = {"moved": 0, "skipped": len(seen), "review": 0, "duplicates": 0}
+            return None, _finish_summary(summary, cache_before, metrics)
 
     file_formats = {ext: cat for cat, exts in DEFAULT_DIRECTORIES.items() for ext in exts}
     files_moved = {}
@@ -109,98 +537,292 @@ def organize_files(directory, dry_run=False, confidence_threshold=None):
 
     review_folder = Path(directory) / config["review_folder_name"]
 
+    templates = valid_templates(config["path_templates"])
+    entries = _iter_entries(directory, files)
+    if templates:
+        # Read headers a little ahead for files the rules will route to a
+        # templated category; ML-routed files are read on demand.
+        entries = metadata_extractor.read_ahead(
+            entries, lambda entry: (file_formats.get(os.path.splitext(entry.name)[1].lower()) in templates
+                                    and not entry.is_dir()))
+
     moved_count = 0
     skipped_count = 0
     review_count = 0
+    duplicate_count = 0
+    in_flight = []
+    organized = []  # (new path, stat) handed to the dedup service afterwards
 
-    for entry in os.scandir(directory):
-        if entry.is_dir():
-            continue
-        file_path = Path(entry.path)
-        ext = file_path.suffix.lower()
-
-        # Determine category
-        if ext in file_formats:
-            category = file_formats[ext]
-            conf = 1.0
-            reason = "rule"
-        else:
-            predicted, conf = predict_category(file_path)
-            if predicted is None:
-                category = "Unsorted"
-                reason = "no_model"
-            else:
-                if conf >= confidence_threshold:
-                    category = predicted
-                    reason = "ml_confident"
+    with metrics.profile():
+        for entry in entries:
+            file_start = metrics.clock()
+            metrics.count("files_seen")
+            try:
+                if entry.is_dir():
+                    continue
+                file_path = Path(entry.path)
+                ext = file_path.suffix.lower()
+
+                signature = None
+                if use_index:
+                    with metrics.phase("stat"):
+                        signature = _entry_signature(entry)
+                    if seen.get(entry.name) == signature:
+                        kept[entry.name] = signature
+                        skipped_count += 1
+                        continue
+
+                # Determine category
+                if ext in file_formats:
+                    category = file_formats[ext]
+                    conf = 1.0
+                    reason = "rule"
                 else:
-                    category = None
-                    reason = "ml_low_confidence"
-
-        # Review or Move
-        if category is None:
-            target_dir = review_folder
-            new_path = target_dir / file_path.name
-            review_count += 1
-            if not dry_run:
-                new_path = move_file_safe(file_path, new_path)
-                review_entries[str(file_path)] = {
-                    "review_path": str(new_path),
-                    "predicted": predicted,
-                    "confidence": conf,
-                    "time": datetime.now().isoformat()
-                }
-            else:
-                dry_run_results.append((file_path.name, str(new_path), f"{conf:.2f}"))
-            continue
+                    with metrics.phase("ml"):
+                        predicted, conf = predict_category(file_path)
+                    if predicted is None:
+                        category = "Unsorted"
+                        reason = "no_model"
+                    else:
+                        if conf >= confidence_threshold:
+                            category = predicted
+                            reason = "ml_confident"
+                        else:
+                            category = None
+                            reason = "ml_low_confidence"
 
-        target_dir = Path(directory) / category
-        new_path = target_dir / file_path.name
-        if dry_run:
-            dry_run_results.append((file_path.name, str(new_path), f"{conf:.2f}"))
-        else:
-            moved_to = move_file_safe(file_path, new_path)
-            files_moved[str(file_path)] = str(moved_to)
-            moved_count += 1
+                metrics.count(reason)
+
+                # Review or Move
+                if category is None:
+                    target_dir = review_folder
+                    new_path = target_dir / file_path.name
+                    if not dry_run:
+                        try:
+                            st = entry.stat()
+                            new_path = move_file_safe(file_path, new_path, metrics)
+                        except OSError as e:
+                            print("[WARN] Failed to move", file_path, "->", new_path, e)
+                            skipped_count += 1
+                            if signature is not None:
+                                kept[entry.name] = signature
+                            continue
+                        review_count += 1
+                        organized.append((new_path, st))
+                        review_entries[str(file_path)] = {
+                            "review_path": str(new_path),
+                            "predicted": predicted,
+                            "confidence": conf,
+                            "time": datetime.now().isoformat()
+                        }
+                    else:
+                        review_count += 1
+                        dry_run_results.append((file_path.name, str(new_path), f"{conf:.2f}"))
+                    continue
+
+                target_dir = Path(directory) / category
+                if category in templates:
+                    with metrics.phase("metadata"):
+                        fields = metadata_extractor.get(entry.path, entry.stat())
+                    target_dir = Path(directory) / render_path(templates[category], fields)
+                new_path = target_dir / file_path.name
+                if dry_run:
+                    dry_run_results.append((file_path.name, str(new_path), f"{conf:.2f}"))
+                else:
+                    try:
+                        st = entry.stat()
+                        moved_to = collapse_duplicate(file_path, new_path, directory, st, metrics)
+                        if moved_to is not None:
+                            files_moved[str(file_path)] = str(moved_to)
+                            duplicate_count += 1
+                            # collapsed (moved aside or hardlinked), not sorted: kept
+                            # out of bytes_moved so copy throughput is not inflated
+                            metrics.count("duplicates")
+                            metrics.count("bytes_collapsed", st.st_size)
+                            continue
+                        moved_to, pending = start_move(file_path, new_path, metrics)
+                    except OSError as e:
+                        print("[WARN] Failed to move", file_path, "->", new_path, e)
+                        skipped_count += 1
+                        if signature is not None:
+                            kept[entry.name] = signature
+                        continue
+                    files_moved[str(file_path)] = str(moved_to)
+                    moved_count += 1
+                    if pending is not None:
+                        in_flight.append((pending, file_path, entry.name, signature, st))
+                    else:
+                        metrics.count("bytes_moved", st.st_size)
+                        organized.append((moved_to, st))
+            finally:
+                metrics.observe("file", file_start)
+
+    # Wait for large cross-device copies still running on the mover's lane.
+    for pending, file_path, name, signature, st in in_flight:
+        try:
+            pending.result()
+            metrics.count("bytes_moved", st.st_size)
+        except OSError as e:
+            print("[WARN] Failed to move", file_path, e)
+            del files_moved[str(file_path)]
+            moved_count -= 1
+            skipped_count += 1
+            if signature is not None:
+                kept[name] = signature
+
+    # Same-size files are hashed in the background with the stats gathered
+    # here, so a duplicate search right after organizing is warm.
+    if organized and config["dedup_warm_after_organize"]:
+        dedup_service.warm(organized)
+
+    # Remember what is left behind so the next incremental pass only
+    # classifies new or changed entries, and skips the directory entirely
+    # while its mtime stays what it is after our moves.
+    if use_index:
+        dir_mtime, racy = _snapshot_mtime(directory, kept)
+        index[index_key] = {"mtime_ns": dir_mtime, "racy": racy, "entries": kept}
+        with metrics.phase("index"):
+            save_index(index)
 
     # Save logs only for real move
     if not dry_run:
-        if files_moved:
-            op = {"time": datetime.now().isoformat(), "moves": files_moved}
-            data = []
-            if os.path.exists(LOG_FILE):
-                try:
-                    data = json.load(open(LOG_FILE))
-                except:
-                    pass
-            data.append(op)
-            with open(LOG_FILE, "w") as f:
-                json.dump(data, f, indent=2)
-            with open(UNDO_FILE, "w") as f:
-                json.dump(op, f, indent=2)
-
-        if review_entries:
-            existing = []
-            if os.path.exists(REVIEW_LOG):
-                try:
-                    existing = json.load(open(REVIEW_LOG))
-                except:
-                    pass
-            existing.extend([{"original_path": k, **v} for k, v in review_entries.items()])
-            with open(REVIEW_LOG, "w") as f:
-                json.dump(existing, f, indent=2)
-
-    summary = {
+        with metrics.phase("logs"):
+            _save_logs(files_moved, review_entries)
+
+    summary = _finish_summary({
         "moved": moved_count,
         "skipped": skipped_count,
-        "review": review_count
-    }
+        "review": review_count,
+        "duplicates": duplicate_count
+    }, cache_before, metrics)
 
     if dry_run:
         return dry_run_results, summary
     else:
         return None, summary
 
+# ======== REVIEW QUEUE ========
+REVIEW_BATCH = 10_000
+REVIEW_WORKERS = 8
+
+def _move_reviewed(src: Path, dest: Path):
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    pending = mover.move(src, dest)
+    if pending is not None:
+        pending.result()
+    return dest
+
+def process_review_queue(confidence_threshold=None, batch_size=REVIEW_BATCH, workers=REVIEW_WORKERS,
+                         metrics=NULL_METRICS):
+    """Re-classify everything waiting in REVIEW with the current model.
+
+    The model file is reloaded if it changed, pending entries are streamed
+    from the review log and scored ``batch_size`` at a time with one
+    ``predict_proba`` call, and the files that now reach the confidence
+    threshold are moved on a thread pool to where ``organize_files`` would
+    have put them: their category folder next to the review folder, or its
+    ``path_templates`` folder, collapsed per ``dedup_on_collision`` when an
+    identical file already has the name. The moves go to the log and undo
+    file; the review log is rewritten with only the entries still pending.
+    """
+    if confidence_threshold is None:
+        confidence_threshold = config["confidence_threshold"]
+    model = reload_model()
+    templates = valid_templates(config["path_templates"])
+
+    still_pending = []
+    files_moved = {}
+    reviewed = {}  # review path -> log entry, restored by undo
+    summary = {"reclassified": 0, "duplicates": 0, "pending": 0, "failed": 0, "missing": 0}
+
+    def flush(batch):
+        if model is None:
+            still_pending.extend(e for e, _ in batch)
+            return
+        with metrics.phase("ml"):
+            names = [Path(e["original_path"]).name for e, _ in batch]
+            data = pd.DataFrame({
+                "filename": names,
+                "extension": [Path(n).suffix.lower() for n in names],
+                "size": [st.st_size for _, st in batch]
+            })
+            try:
+                proba = model.predict_proba(data)
+            except Exception as err:
+                print("[ML ERROR]", err)
+                still_pending.extend(e for e, _ in batch)
+                return
+            best = proba.argmax(axis=1)
+            confidences = proba.max(axis=1)
+
+        # Names are picked here, so parallel moves never race for the same target.
+        taken = set()
+        plan = []
+        with metrics.phase("probe"):
+            for (entry, st), cls, conf in zip(batch, model.classes_[best], confidences):
+                entry["predicted"], entry["confidence"] = str(cls), float(conf)
+                if conf < confidence_threshold:
+                    still_pending.append(entry)
+                    continue
+                review_path = Path(entry["review_path"])
+                directory = review_path.parent.parent
+                target_dir = directory / str(cls)
+                if cls in templates:
+                    with metrics.phase("metadata"):
+                        fields = metadata_extractor.get(str(review_path), st)
+                    target_dir = directory / render_path(templates[cls], fields)
+                dest = target_dir / Path(entry["original_path"]).name
+                # Collapsing is rare (a name collision with an identical file)
+                # and is done here, so it never races the parallel moves.
+                try:
+                    collapsed = collapse_duplicate(review_path, dest, directory, st, metrics, taken)
+                except OSError as e:
+                    print("[WARN] Failed to move", review_path, e)
+                    summary["failed"] += 1
+                    still_pending.append(entry)
+                    continue
+                if collapsed is not None:
+                    taken.add(collapsed)
+                    files_moved[str(review_path)] = str(collapsed)
+                    reviewed[str(review_path)] = entry
+                    summary["duplicates"] += 1
+                    continue
+                dest = _unique_target(dest, taken)
+                taken.add(dest)
+                plan.append((entry, review_path, dest))
+
+        with metrics.phase("move"), ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_move_reviewed, src, dest) for _, src, dest in plan]
+            for (entry, src, _), future in zip(plan, futures):
+                try:
+                    files_moved[str(src)] = str(future.result())
+                    reviewed[str(src)] = entry
+                    summary["reclassified"] += 1
+                except OSError as e:
+                    print("[WARN] Failed to move", src, e)
+                    summary["failed"] += 1
+                    still_pending.append(entry)
+
+    batch = []
+    for entry in iter_review_log():
+        try:
+            st = os.stat(entry["review_path"])
+        except (OSError, KeyError, TypeError):
+            summary["missing"] += 1  # handled by hand meanwhile: drop from the log
+            continue
+        batch.append((entry, st))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    with metrics.phase("logs"):
+        _save_logs(files_moved, {}, reviewed)
+        _write_review_log(still_pending)
+    summary["pending"] = len(still_pending)
+    return summary
+
 # ======== UNDO ========
 def undo_last_operation():
     if not os.path.exists(UNDO_FILE):
@@ -209,12 +831,25 @@ def undo_last_operation():
     with open(UNDO_FILE) as f:
         op = json.load(f)
     moves = op.get("moves", {})
+    reviewed = op.get("reviewed", {})
+    restored_review = []
     for src, dst in moves.items():
         if os.path.exists(dst):
             try:
-                move_file_safe(Path(dst), Path(src))
+                restored = move_file_safe(Path(dst), Path(src))
             except Exception as e:
                 print("Failed to move back", dst, "->", src, e)
+                continue
+            # Files put back into REVIEW must be in the review log again, or
+            # the review queue would never see them.
+            entry = reviewed.get(src)
+            if entry is None and Path(src).parent.name == config["review_folder_name"]:
+                entry = {"original_path": src, "predicted": None, "confidence": 0.0}
+            if entry is not None:
+                restored_review.append(dict(entry, review_path=str(restored),
+                                            time=datetime.now().isoformat()))
+    if restored_review:
+        _append_review_log(restored_review)
     os.remove(UNDO_FILE)
     messagebox.showinfo("Undo", "Undo completed.")
 
@@ -227,22 +862,41 @@ class FileZenApp:
         self.dark_theme = tk.BooleanVar(value=False)
         self.conf_val = tk.DoubleVar(value=config["confidence_threshold"])
         self.dry_run_enabled = tk.BooleanVar(value=True)
+        self.qt_app = None
+        self.dup_window = None
         self.setup_ui()
     
     def open_duplicate_finder(self, button):
-        """Open the Duplicate Finder tool and disable the button while it's running."""
-        import subprocess
-        button.config(state="disabled")
+        """Open the Duplicate Finder tool and disable the button while it's running.
 
-        process = subprocess.Popen(["python", "filezen_duplicate_finder.py"])
+        The window lives in this process and shares ``dedup_service`` (and its
+        digest cache) with the organizer. Qt is imported on first use and its
+        events are pumped from the Tk loop while the window is visible.
+        """
+        try:
+            from PyQt5 import QtWidgets
+            import filezen_duplicate_finder
+        except Exception as e:
+            messagebox.showerror("Find Duplicates", f"The Duplicate Finder needs PyQt5:\n{e}")
+            return
+
+        if self.qt_app is None:
+            self.qt_app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+        if self.dup_window is None:
+            self.dup_window = filezen_duplicate_finder.FileZen(service=dedup_service, io_config=config)
+        button.config(state="disabled")
+        self.dup_window.show()
+        self.dup_window.raise_()
+        self.dup_window.activateWindow()
 
-        def check_process():
-            if process.poll() is None:
-                button.after(1000, check_process)
+        def pump_qt():
+            self.qt_app.processEvents()
+            if self.dup_window.isVisible():
+                button.after(DUPLICATE_FINDER_PUMP_MS, pump_qt)
             else:
                 button.config(state="normal")
 
-        check_process()
+        pump_qt()
 
     def setup_ui(self):
         self.apply_theme()
@@ -268,10 +922,11 @@ class FileZenApp:
         btn_frame.pack(fill="x", padx=20, pady=10)
 
         self.btn_organize = ttk.Button(btn_frame, text="Organize Files", command=self.on_organize_click)
+        self.btn_review = ttk.Button(btn_frame, text="Process Review Queue", command=self.on_review_click)
         self.btn_undo = ttk.Button(btn_frame, text="Undo Last Operation", command=undo_last_operation)
         self.btn_exit = ttk.Button(btn_frame, text="Exit", command=self.root.quit)
 
-        for i, btn in enumerate([self.btn_organize, self.btn_undo, self.btn_exit]):
+        for i, btn in enumerate([self.btn_organize, self.btn_review, self.btn_undo, self.btn_exit]):
             btn.grid(row=0, column=i, padx=5, pady=5, sticky="ew")
             btn_frame.columnconfigure(i, weight=1)
 
@@ -338,14 +993,53 @@ class FileZenApp:
     def update_conf_label(self, val):
         self.conf_label.config(text=f"{float(val):.2f}")
 
+    def run_in_background(self, work, done):
+        """Run ``work()`` on a worker thread and pass its result to ``done`` on the Tk thread.
+
+        The worker applies ``io_nice``/``io_idle_priority`` (per thread on
+        Linux), so large runs yield to other programs while the window stays
+        responsive. Organize and review are disabled until it finishes.
+        """
+        buttons = (self.btn_organize, self.btn_review, self.btn_undo)
+        for button in buttons:
+            button.config(state="disabled")
+        outcome = {}
+
+        def target():
+            lower_priority(config)
+            try:
+                outcome["result"] = work()
+            except Exception as e:
+                outcome["error"] = e
+
+        worker = threading.Thread(target=target, name="filezen-organize", daemon=True)
+        worker.start()
+
+        def poll():
+            if worker.is_alive():
+                self.root.after(BACKGROUND_POLL_MS, poll)
+                return
+            for button in buttons:
+                button.config(state="normal")
+            if "error" in outcome:
+                messagebox.showerror("FileZen", f"Operation failed: {outcome['error']}")
+            else:
+                done(outcome["result"])
+
+        poll()
+
     def on_organize_click(self):
         directory = filedialog.askdirectory()
         if not directory:
             return
 
         dry_run = self.dry_run_enabled.get()
-        logs, summary = organize_files(directory, dry_run=dry_run, confidence_threshold=self.conf_val.get())
+        confidence_threshold = self.conf_val.get()
+        self.run_in_background(
+            lambda: organize_files(directory, dry_run=dry_run, confidence_threshold=confidence_threshold),
+            lambda result: self.show_organize_result(dry_run, *result))
 
+    def show_organize_result(self, dry_run, logs, summary):
         if dry_run:
             if not logs:
                 messagebox.showinfo("Dry Run", "No files to preview.")
@@ -357,13 +1051,29 @@ class FileZenApp:
                 f"Files organized successfully!\n\n"
                 f"Moved: {summary.get('moved', 0)}\n"
                 f"Skipped: {summary.get('skipped', 0)}\n"
-                f"Review: {summary.get('review', 0)}"
+                f"Review: {summary.get('review', 0)}\n"
+                f"Duplicates: {summary.get('duplicates', 0)}"
             )
             self.conf_val.set(config["confidence_threshold"])
             self.dry_run_enabled.set(True)
             self.apply_theme()
             self.root.update_idletasks()
 
+    def on_review_click(self):
+        confidence_threshold = self.conf_val.get()
+        self.run_in_background(lambda: process_review_queue(confidence_threshold=confidence_threshold),
+                               self.show_review_result)
+
+    def show_review_result(self, summary):
+        messagebox.showinfo(
+            "Review Queue",
+            f"Re-classified: {summary['reclassified']}\n"
+            f"Duplicates: {summary['duplicates']}\n"
+            f"Still in review: {summary['pending']}\n"
+            f"Failed: {summary['failed']}\n"
+            f"No longer in review: {summary['missing']}"
+        )
+
     def show_preview(self, logs):
         preview = tk.Toplevel(self.root)
         preview.title("Dry Run Preview")
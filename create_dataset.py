@@ -1,7 +1,21 @@
 # create_dataset.py
 import os
+import sys
+import csv
+import json
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import pandas as pd
-from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = None
+    pq = None
 
 DEFAULT_DIRECTORIES = {
     "Documents": [".pdf", ".docx", ".doc", ".txt", ".odt", ".rtf", ".md"],
@@ -17,36 +31,221 @@ DEFAULT_DIRECTORIES = {
     "Database Files": [".db", ".sqlite", ".mdb", ".accdb", ".frm", ".myd", ".ibd"]
 }
 
+# extension -> category, first category listing an extension wins
+EXTENSION_CATEGORIES = {}
+for _cat, _exts in DEFAULT_DIRECTORIES.items():
+    for _ext in _exts:
+        EXTENSION_CATEGORIES.setdefault(_ext, _cat)
+
+COLUMNS = ["filename", "extension", "size", "category"]
+CHUNK_ROWS = 50_000
+PROGRESS_FILE = "_progress.json"
+ROOT_UNIT = "."  # files directly inside the base folder
+
+
+# ======== WALKER ========
+def iter_labeled_files(top, recursive=True):
+    """Yield (filename, extension, size, category) for labeled files under ``top``.
+
+    Uses an explicit stack of ``os.scandir`` calls so the stat data comes from
+    the directory listing where the OS provides it, and nothing is buffered.
+    """
+    stack = [top]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            stack.append(entry.path)
+                        continue
+                    ext = os.path.splitext(entry.name)[1].lower()
+                    cat = EXTENSION_CATEGORIES.get(ext)
+                    if cat and entry.is_file():
+                        yield (entry.name, ext, entry.stat().st_size, cat)
+                except OSError:
+                    continue
+
+
 def create_training_data(base_dir):
-    data = []
-    for root, _, files in os.walk(base_dir):
-        for file in files:
-            path = Path(root) / file
-            ext = path.suffix.lower()
-
-            # label by extension (only files that match DEFAULT_DIRECTORIES)
-            cat = None
-            for k, exts in DEFAULT_DIRECTORIES.items():
-                if ext in exts:
-                    cat = k
-                    break
-            if cat:
-                data.append({
-                    "filename": file,
-                    "extension": ext,
-                    "size": path.stat().st_size,
-                    "category": cat
-                })
-
-    df = pd.DataFrame(data)
-    return df
+    return pd.DataFrame(list(iter_labeled_files(base_dir)), columns=COLUMNS)
+
+
+# ======== CHUNKED WRITERS ========
+class _CsvPart:
+    def __init__(self, path):
+        self.f = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.f)
+        self.writer.writerow(COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class _ParquetPart:
+    def __init__(self, path):
+        self.schema = pa.schema([("filename", pa.string()), ("extension", pa.string()),
+                                 ("size", pa.int64()), ("category", pa.string())])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        self.writer.write_table(pa.Table.from_arrays(
+            [pa.array(col, type=field.type) for col, field in zip(columns, self.schema)],
+            schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+PART_WRITERS = {"csv": _CsvPart, "parquet": _ParquetPart}
+
+
+def _part_name(unit, fmt):
+    return f"part-{hashlib.sha1(unit.encode('utf-8', 'surrogateescape')).hexdigest()[:16]}.{fmt}"
+
+
+def _harvest(base_dir, unit, part_path, fmt, chunk_rows):
+    """Walk one unit into its own part file, ``chunk_rows`` rows at a time."""
+    if unit == ROOT_UNIT:
+        rows = iter_labeled_files(base_dir, recursive=False)
+    else:
+        rows = iter_labeled_files(os.path.join(base_dir, unit))
+
+    part = PART_WRITERS[fmt](part_path)
+    count = 0
+    chunk = []
+    try:
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                part.write(chunk)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            part.write(chunk)
+            count += len(chunk)
+    finally:
+        part.close()
+    return count
+
+
+# ======== RESUMABLE BUILD ========
+def _load_progress(out_dir, base_dir, fmt):
+    path = os.path.join(out_dir, PROGRESS_FILE)
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                progress = json.load(f)
+            if progress.get("base") == base_dir and progress.get("format") == fmt:
+                return progress
+        except Exception:
+            pass
+    return {"base": base_dir, "format": fmt, "done": {}}
+
+
+def _save_progress(out_dir, progress):
+    path = os.path.join(out_dir, PROGRESS_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(progress, f, indent=2)
+    os.replace(tmp, path)
+
+
+def build_dataset(base_dir, out_dir, fmt="csv", workers=8, chunk_rows=CHUNK_ROWS, resume=True):
+    """Harvest labels under ``base_dir`` into part files inside ``out_dir``.
+
+    Each top-level subfolder is walked by its own worker and written to its
+    own part file. Finished units are recorded in ``_progress.json``; with
+    ``resume`` an interrupted build only redoes the units that did not finish.
+    Returns (part files, units that failed and still need a resumed run).
+    """
+    if fmt == "parquet" and pa is None:
+        raise RuntimeError("Parquet output needs pyarrow installed")
+    base_dir = os.path.abspath(base_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    progress = _load_progress(out_dir, base_dir, fmt) if resume else {"base": base_dir, "format": fmt, "done": {}}
+
+    units = [ROOT_UNIT]
+    with os.scandir(base_dir) as it:
+        units.extend(sorted(e.name for e in it if e.is_dir(follow_symlinks=False)))
+    todo = [u for u in units if u not in progress["done"]]
+    if len(todo) < len(units):
+        print(f"Resuming: {len(units) - len(todo)} of {len(units)} folders already done.")
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for unit in todo:
+            part = _part_name(unit, fmt)
+            futures[pool.submit(_harvest, base_dir, unit, os.path.join(out_dir, part), fmt, chunk_rows)] = (unit, part)
+        for fut in as_completed(futures):
+            unit, part = futures[fut]
+            try:
+                rows = fut.result()
+            except Exception as e:
+                print(f"[WARN] {unit}: {e} (will be retried on resume)")
+                failed.append(unit)
+                continue
+            progress["done"][unit] = {"part": part, "rows": rows}
+            _save_progress(out_dir, progress)
+            print(f"  {unit}: {rows} rows")
+
+    parts = [os.path.join(out_dir, info["part"]) for info in progress["done"].values()]
+    return parts, failed
+
+
+def merge_csv_parts(parts, dest):
+    """Concatenate CSV part files into ``dest`` with a single header."""
+    total = 0
+    with open(dest, "w", newline="", encoding="utf-8") as out:
+        out.write(",".join(COLUMNS) + "\r\n")
+        for part in parts:
+            with open(part, "r", newline="", encoding="utf-8") as f:
+                f.readline()  # header
+                for line in f:
+                    out.write(line)
+                    total += 1
+    return total
+
 
 if __name__ == "__main__":
-    base = input("Path to folder with labeled files: ").strip()
-    df = create_training_data(base)
-    if df.empty:
+    parser = argparse.ArgumentParser(description="Build a labeled training dataset from a folder tree.")
+    parser.add_argument("base", nargs="?", help="folder with labeled files")
+    parser.add_argument("--out", default="training_data-1.csv",
+                        help="merged CSV (csv format) or output folder (parquet format)")
+    parser.add_argument("--format", choices=sorted(PART_WRITERS), default="csv")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--no-resume", action="store_true")
+    args = parser.parse_args()
+
+    base = args.base or input("Path to folder with labeled files: ").strip()
+    out_dir = args.out if args.format == "parquet" else args.out + ".parts"
+    parts, failed = build_dataset(base, out_dir, args.format, args.workers, args.chunk_rows,
+                                  not args.no_resume)
+
+    if failed:
+        # A merged file missing whole folders would silently skew training.
+        print(f"[ERROR] {len(failed)} folder(s) failed: {', '.join(sorted(failed))}")
+        print(f"Finished parts are kept in {out_dir}; run again to resume. Nothing was merged.")
+        sys.exit(1)
+
+    if args.format == "csv":
+        total = merge_csv_parts(parts, args.out)
+        shutil.rmtree(out_dir)
+    else:
+        total = sum(pq.ParquetFile(p).metadata.num_rows for p in parts)
+
+    if not total:
         print("No labeled files found.")
     else:
-        out = "training_data-1.csv"
-        df.to_csv(out, index=False)
-        print(f"Saved {len(df)} rows to {out}")
+        print(f"Saved {total} rows to {args.out}")
@@ -1,5 +1,15 @@
+import os
 import csv
-import random
+import argparse
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = None
+    pq = None
 
 categories = {
     "Audio": ["mp3", "wav", "aac", "flac", "ogg"],
@@ -29,56 +39,239 @@ prefixes = ["project", "backup", "assignment", "holiday", "report", "setup",
 suffixes = ["2023", "v1", "final", "draft", "01", "test", "prod", "log",
             "media", "archive", "copy", "backup", "temp"]
 
-def add_noise(name: str) -> str:
-    """Add casing variation, typos, and random symbols."""
-    if random.random() < 0.3:
-        name = name.upper()
-    elif random.random() < 0.3:
-        name = name.capitalize()
+unknown_extensions = ["bak", "tmp", "xyz", "abc", "zzz"]
+junk_suffixes = ["~", "-", "_new", "_old"]
+
+UNKNOWN_CATEGORY = "Unknown/No Extension"
+COLUMNS = ["filename", "extension", "size", "category"]
+BATCH_ROWS = 100_000
+
+DEFAULT_NOISE = {
+    "mislabel": 0.05,      # label replaced by a random category
+    "unknown_ext": 0.05,   # junk extension, extensionless name, Unknown label
+    "upper": 0.3,          # NAME IN CAPITALS
+    "capitalize": 0.3,     # Name capitalized (when not upper-cased)
+    "typo": 0.1,           # one character dropped
+    "junk_suffix": 0.1,    # "~", "-", "_new", "_old" appended
+}
+
+_CATEGORY_NAMES = np.array(list(categories))
+_ALL_EXTS = np.array([ext for exts in categories.values() for ext in exts])
+_EXT_COUNTS = np.array([len(exts) for exts in categories.values()])
+_EXT_OFFSETS = np.concatenate(([0], np.cumsum(_EXT_COUNTS)[:-1]))
+_UNKNOWN_IDX = list(categories).index(UNKNOWN_CATEGORY)
+
+
+def category_weights(weights=None):
+    """Normalize a {category: weight} mapping (missing categories weigh 1)."""
+    weights = weights or {}
+    unknown = set(weights) - set(categories)
+    if unknown:
+        raise ValueError(f"Unknown categories: {sorted(unknown)}")
+    w = np.array([float(weights.get(c, 1.0)) for c in categories])
+    return w / w.sum()
 
-    if random.random() < 0.1 and len(name) > 3:
-        idx = random.randint(0, len(name) - 2)
-        name = name[:idx] + name[idx+1:]
 
-    if random.random() < 0.1:
-        name += random.choice(["~", "-", "_new", "_old"])
+def _apply_typos(names, mask, rng):
+    # Per-row string surgery; only touches the (small) noisy subset.
+    for i in np.flatnonzero(mask):
+        name = names[i]
+        if len(name) > 3:
+            idx = rng.integers(0, len(name) - 1)
+            names[i] = name[:idx] + name[idx + 1:]
 
-    return name
 
-def generate_filename(extension, idx, category):
-    if extension == "UNKNOWN":
-        base = random.choice(extensionless_examples.get(category, ["file"]))
-        return add_noise(f"{base}_{idx}")  # ✅ no extension
-    else:
-        base = f"{random.choice(prefixes)}_{random.choice(suffixes)}_{idx}"
-        return add_noise(base) + "." + extension
+def generate_sizes(rng, n, size_range, size_dist="uniform"):
+    """File sizes in ``size_range``; "lognormal" clusters around its geometric middle."""
+    lo, hi = size_range
+    if size_dist == "lognormal":
+        mid = np.log(max(lo, 1)) / 2 + np.log(max(hi, 1)) / 2
+        sizes = rng.lognormal(mid, (np.log(max(hi, 1)) - mid) / 3, size=n)
+        return np.clip(sizes, lo, hi).astype(np.int64)
+    return rng.integers(lo, hi, size=n, endpoint=True)
 
-rows = []
-num_samples = 2000
 
-for i in range(num_samples):
-    category = random.choice(list(categories.keys()))
-    extension = random.choice(categories[category])
+def generate_batch(rng, start, n, p, noise, size_range, size_dist="uniform"):
+    """Return one batch of ``n`` rows as a dict of NumPy columns."""
+    cat_idx = rng.choice(len(_CATEGORY_NAMES), size=n, p=p)
+    pick = (rng.random(n) * _EXT_COUNTS[cat_idx]).astype(np.int64)
+    ext = _ALL_EXTS[_EXT_OFFSETS[cat_idx] + pick].astype(object)
 
     # Introduce mislabeled/mixed data (simulate messy real-world)
-    if random.random() < 0.05:
-        category = random.choice(list(categories.keys()))
+    mislabel = rng.random(n) < noise["mislabel"]
+    cat_idx[mislabel] = rng.choice(len(_CATEGORY_NAMES), size=int(mislabel.sum()), p=p)
 
     # Introduce unknown extensions
-    if random.random() < 0.05:
-        extension = random.choice(["bak", "tmp", "xyz", "abc", "zzz"])
-        category = "Unknown/No Extension"  # ✅ map unknowns properly
-        filename = generate_filename("UNKNOWN", i, category)
-        rows.append([filename, extension, random.randint(500, 50_000_000), category])
-        continue
-
-    filename = generate_filename(extension, i, category)
-    size = random.randint(500, 50_000_000)
-    rows.append([filename, extension if extension != "UNKNOWN" else "", size, category])
-
-with open("training_data.csv", "w", newline="", encoding="utf-8") as f:
-    writer = csv.writer(f)
-    writer.writerow(["filename", "extension", "size", "category"])
-    writer.writerows(rows)
-
-print(f"✅ Generated {num_samples} realistic noisy samples in training_data.csv (with UNKNOWN fixed)")
+    unknown = rng.random(n) < noise["unknown_ext"]
+    cat_idx[unknown] = _UNKNOWN_IDX
+    ext[unknown] = rng.choice(unknown_extensions, size=int(unknown.sum()))
+    extensionless = unknown | (ext == "UNKNOWN")
+
+    ids = np.arange(start, start + n).astype(str).astype(object)
+    base = (rng.choice(prefixes, size=n).astype(object) + "_"
+            + rng.choice(suffixes, size=n).astype(object) + "_" + ids)
+    for c, cat in enumerate(_CATEGORY_NAMES):
+        rows = extensionless & (cat_idx == c)
+        if rows.any():
+            pool = extensionless_examples.get(cat, ["file"])
+            base[rows] = rng.choice(pool, size=int(rows.sum())).astype(object) + "_" + ids[rows]
+
+    # Casing variation, typos, and random symbols
+    upper = rng.random(n) < noise["upper"]
+    capitalize = ~upper & (rng.random(n) < noise["capitalize"])
+    base[upper] = np.char.upper(base[upper].astype(str)).astype(object)
+    base[capitalize] = np.char.capitalize(base[capitalize].astype(str)).astype(object)
+    _apply_typos(base, rng.random(n) < noise["typo"], rng)
+    junk = rng.random(n) < noise["junk_suffix"]
+    base[junk] = base[junk] + rng.choice(junk_suffixes, size=int(junk.sum())).astype(object)
+
+    filename = np.where(extensionless, base, base + "." + ext)
+    ext[ext == "UNKNOWN"] = ""
+    return {
+        "filename": filename,
+        "extension": ext,
+        "size": generate_sizes(rng, n, size_range, size_dist),
+        "category": _CATEGORY_NAMES[cat_idx],
+    }
+
+
+def generate_rows(num_rows, weights=None, noise=None, seed=None,
+                  size_range=(500, 50_000_000), batch_rows=BATCH_ROWS, size_dist="uniform"):
+    """Yield ``num_rows`` synthetic rows in vectorized batches of ``batch_rows``."""
+    rng = np.random.default_rng(seed)
+    p = category_weights(weights)
+    noise = {**DEFAULT_NOISE, **(noise or {})}
+    for start in range(0, num_rows, batch_rows):
+        yield generate_batch(rng, start, min(batch_rows, num_rows - start), p, noise, size_range,
+                             size_dist)
+
+
+# ======== OUTPUT ========
+class DatasetWriter:
+    """Streams batches to CSV or Parquet without holding the dataset in memory."""
+
+    def __init__(self, path, fmt="csv"):
+        self.fmt = fmt
+        self.rows = 0
+        if fmt == "parquet":
+            if pa is None:
+                raise RuntimeError("Parquet output needs pyarrow installed")
+            self.schema = pa.schema([("filename", pa.string()), ("extension", pa.string()),
+                                     ("size", pa.int64()), ("category", pa.string())])
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.f = open(path, "w", newline="", encoding="utf-8")
+            self.writer = csv.writer(self.f)
+            self.writer.writerow(COLUMNS)
+
+    def write(self, batch):
+        if self.fmt == "parquet":
+            self.writer.write_table(pa.table({c: batch[c] for c in COLUMNS}, schema=self.schema))
+        else:
+            self.writer.writerows(zip(*(batch[c].tolist() for c in COLUMNS)))
+        self.rows += len(batch["size"])
+
+    def close(self):
+        if self.fmt == "parquet":
+            self.writer.close()
+        else:
+            self.f.close()
+
+
+class TreeMaterializer:
+    """Creates sparse files on disk for generated rows (benchmark fixtures).
+
+    Each file holds a short unique header and is then extended to its size
+    with ``truncate``, so it takes almost no disk space. ``duplicate_ratio``
+    of the files copy the size and header of an earlier file in the batch,
+    making them byte-identical duplicates. ``flat`` puts everything in one
+    folder (an ``organize_files`` inbox); otherwise files are spread over
+    subfolders of ``fanout`` entries (a ``ScanWorker`` tree). Names get the
+    row's sequence number as prefix, since typo noise can make them collide.
+    """
+
+    def __init__(self, root, limit=None, flat=False, fanout=1000, max_size=None,
+                 duplicate_ratio=0.0, seed=None):
+        self.root = root
+        self.limit = limit
+        self.flat = flat
+        self.fanout = fanout
+        self.max_size = max_size
+        self.duplicate_ratio = duplicate_ratio
+        self.rng = np.random.default_rng(seed)
+        self.count = 0
+        self.folder = root  # current fanout subfolder, kept across batches
+        os.makedirs(root, exist_ok=True)
+
+    def write(self, batch):
+        n = len(batch["size"])
+        if self.limit is not None:
+            n = min(n, self.limit - self.count)
+        if n <= 0:
+            return
+        sizes = batch["size"][:n].copy()
+        if self.max_size is not None:
+            np.minimum(sizes, self.max_size, out=sizes)
+        content = np.arange(self.count, self.count + n)
+        dup = self.rng.random(n) < self.duplicate_ratio
+        dup[0] = False
+        # Each duplicate copies a random non-duplicate row that precedes it.
+        originals = np.flatnonzero(~dup)
+        before = np.cumsum(~dup)[dup]
+        src = originals[(self.rng.random(len(before)) * before).astype(np.int64)]
+        sizes[dup] = sizes[src]
+        content[dup] = content[src]
+
+        for i, name in enumerate(batch["filename"][:n].tolist()):
+            seq = self.count + i
+            if not self.flat and seq % self.fanout == 0:
+                self.folder = os.path.join(self.root, f"d{seq // self.fanout:06d}")
+                os.makedirs(self.folder, exist_ok=True)
+            with open(os.path.join(self.folder, f"{seq:08d}_{name}"), "wb") as f:
+                header = f"{content[i]}\n".encode()
+                size = int(sizes[i])
+                f.write(header[:size])
+                f.truncate(size)
+        self.count += n
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic FileZen training dataset.")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--out", default="training_data.csv")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--weights", default="",
+                        help='class distribution, e.g. "Images=5,Documents=3" (others weigh 1)')
+    for key, value in DEFAULT_NOISE.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=float, default=value)
+    parser.add_argument("--min-size", type=int, default=500)
+    parser.add_argument("--max-size", type=int, default=50_000_000)
+    parser.add_argument("--size-dist", choices=["uniform", "lognormal"], default="uniform")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS)
+    parser.add_argument("--materialize", metavar="DIR", help="also create sparse files under DIR")
+    parser.add_argument("--materialize-rows", type=int, default=None)
+    parser.add_argument("--flat", action="store_true", help="materialize into a single folder")
+    parser.add_argument("--file-size-cap", type=int, default=None,
+                        help="cap materialized file sizes (bytes)")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0)
+    args = parser.parse_args()
+
+    weights = {}
+    for item in filter(None, args.weights.split(",")):
+        name, _, value = item.rpartition("=")
+        weights[name.strip()] = float(value)
+    noise = {key: getattr(args, key) for key in DEFAULT_NOISE}
+
+    sinks = [DatasetWriter(args.out, args.format)]
+    if args.materialize:
+        sinks.append(TreeMaterializer(args.materialize, args.materialize_rows, args.flat,
+                                      max_size=args.file_size_cap,
+                                      duplicate_ratio=args.duplicate_ratio, seed=args.seed))
+    for batch in generate_rows(args.rows, weights, noise, args.seed,
+                               (args.min_size, args.max_size), args.batch_rows, args.size_dist):
+        for sink in sinks:
+            sink.write(batch)
+    sinks[0].close()
+
+    print(f"✅ Generated {args.rows} realistic noisy samples in {args.out}")
@@ -0,0 +1,411 @@
+# filezen_async.py
+"""asyncio pipelines for organizing and duplicate scanning on slow mounts.
+
+On NFS/SMB every ``stat``, ``scandir``, ``mkdir`` and ``rename`` is a network
+round-trip. Here those calls run on a bounded thread pool per mount point
+(sized by the ``mount_concurrency`` config key, e.g. ``{"/mnt/nas": 32}``)
+and the stages are connected by bounded queues, so dozens of requests are
+in flight while memory stays flat:
+
+    list -> stat -> classify -> move        (organize_async)
+    walk + stat -> hash -> group            (scan_async)
+
+``organize_files`` switches to this pipeline for directories on a mount
+listed in ``mount_concurrency``; the CLI runs it for any folder:
+
+    python filezen_async.py organize /mnt/nas/inbox
+    python filezen_async.py scan /mnt/nas/photos
+"""
+import os
+import asyncio
+import argparse
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from filezen_dedup import FileRecordStore, DuplicateGroups, hash_file
+from filezen_metadata import render_path, valid_templates
+
+DEFAULT_CONCURRENCY = 16
+QUEUE_DEPTH = 256
+CLASSIFY_TASKS = 4
+
+
+# ======== PER-MOUNT POOLS ========
+def mount_point(path):
+    path = os.path.realpath(path)
+    while not os.path.ismount(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def uses_async_io(directory, cfg):
+    """True if ``directory`` lives on a mount configured in ``mount_concurrency``."""
+    mounts = cfg.get("mount_concurrency") or {}
+    return bool(mounts) and mount_point(directory) in {os.path.realpath(m) for m in mounts}
+
+
+class MountPools:
+    """One bounded thread pool per mount point for blocking filesystem calls."""
+
+    def __init__(self, concurrency=None, default=DEFAULT_CONCURRENCY):
+        self.concurrency = {os.path.realpath(m): n for m, n in (concurrency or {}).items()}
+        self.default = default
+        self._mounts = {}  # directory -> mount point
+        self._pools = {}   # mount point -> executor
+
+    def size(self, path):
+        return self.concurrency.get(self._mount(path), self.default)
+
+    def _mount(self, path):
+        directory = os.path.dirname(str(path))
+        mount = self._mounts.get(directory)
+        if mount is None:
+            mount = self._mounts[directory] = mount_point(directory)
+        return mount
+
+    def pool(self, path):
+        mount = self._mount(path)
+        pool = self._pools.get(mount)
+        if pool is None:
+            pool = self._pools[mount] = ThreadPoolExecutor(
+                max_workers=self.concurrency.get(mount, self.default), thread_name_prefix="filezen-io")
+        return pool
+
+    async def run(self, path, fn, *args):
+        """Run ``fn(*args)`` on the pool of the mount holding ``path``."""
+        return await asyncio.get_running_loop().run_in_executor(self.pool(path), fn, *args)
+
+    def close(self):
+        for pool in self._pools.values():
+            pool.shutdown(wait=True)
+        self._pools.clear()
+
+
+# ======== ORGANIZE ========
+class _TargetDir:
+    """Names in a target folder, listed once and then reserved in memory.
+
+    Replaces a per-file ``exists`` probe (one round-trip each) and keeps
+    concurrent moves from picking the same free name.
+    """
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.names = None
+
+
+def _prepare_dir(target_dir):
+    target_dir.mkdir(parents=True, exist_ok=True)
+    return set(os.listdir(target_dir))
+
+
+def _list_files(directory):
+    with os.scandir(directory) as it:
+        return [entry for entry in it if not entry.is_dir()]
+
+
+async def _reserve(pools, targets, target_dir, name):
+    target = targets.setdefault(target_dir, _TargetDir())
+    async with target.lock:
+        if target.names is None:
+            target.names = await pools.run(target_dir, _prepare_dir, target_dir)
+        base, ext = os.path.splitext(name)
+        candidate, i = name, 1
+        while candidate in target.names:
+            candidate = f"{base}_{i}{ext}"
+            i += 1
+        target.names.add(candidate)
+    return target_dir / candidate
+
+
+async def organize_async(directory, dry_run=False, confidence_threshold=None, pools=None, host=None):
+    """Asynchronous ``organize_files``: same routing, logs, undo file and summary.
+
+    ``host`` is the FileZen module whose config, model and mover are used
+    (imported on demand, so scanning never loads the model). Path templates
+    are honoured; the snapshot index and ``dedup_on_collision`` are left to
+    the sequential organizer.
+    """
+    if host is None:
+        import FileZen as host
+    config = host.config
+
+    if confidence_threshold is None:
+        confidence_threshold = config["confidence_threshold"]
+    own_pools = pools is None
+    if own_pools:
+        pools = MountPools(config["mount_concurrency"])
+    loop = asyncio.get_running_loop()
+    ml_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="filezen-ml")
+
+    file_formats = {ext: cat for cat, exts in host.DEFAULT_DIRECTORIES.items() for ext in exts}
+    templates = valid_templates(config["path_templates"])
+    review_folder = Path(directory) / config["review_folder_name"]
+    stat_q = asyncio.Queue(QUEUE_DEPTH)
+    classify_q = asyncio.Queue(QUEUE_DEPTH)
+    move_q = asyncio.Queue(QUEUE_DEPTH)
+    targets = {}
+    files_moved = {}
+    review_entries = {}
+    dry_run_results = []
+    counts = {"moved": 0, "skipped": 0, "review": 0}
+
+    # Every stage handles its own per-file errors: a stage whose tasks all
+    # died would stop reading its bounded queue and hang the whole pipeline.
+    async def stater():
+        while (entry := await stat_q.get()) is not None:
+            try:
+                st = await pools.run(entry.path, entry.stat)
+            except Exception:
+                counts["skipped"] += 1
+                continue
+            await classify_q.put((Path(entry.path), st))
+
+    async def classifier():
+        while (item := await classify_q.get()) is not None:
+            file_path, st = item
+            ext = file_path.suffix.lower()
+            predicted = None
+            if ext in file_formats:
+                category, conf = file_formats[ext], 1.0
+            else:
+                try:
+                    predicted, conf = await loop.run_in_executor(ml_pool, host.predict_category,
+                                                                 file_path, st.st_size)
+                except Exception as e:
+                    print("[WARN] Failed to classify", file_path, e)
+                    counts["skipped"] += 1
+                    continue
+                if predicted is None:
+                    category = "Unsorted"
+                elif conf >= confidence_threshold:
+                    category = predicted
+                else:
+                    category = None
+            await move_q.put((file_path, st, category, predicted, conf))
+
+    async def mover():
+        while (item := await move_q.get()) is not None:
+            file_path, st, category, predicted, conf = item
+            if category is None:
+                target_dir = review_folder
+            else:
+                target_dir = Path(directory) / category
+                if category in templates:
+                    try:
+                        fields = await pools.run(file_path, host.metadata_extractor.get, str(file_path), st)
+                        target_dir = Path(directory) / render_path(templates[category], fields)
+                    except Exception as e:
+                        print("[WARN] No metadata for", file_path, e)
+            if dry_run:
+                if category is None:
+                    counts["review"] += 1
+                dry_run_results.append((file_path.name, str(target_dir / file_path.name), f"{conf:.2f}"))
+                continue
+
+            try:
+                dest = await _reserve(pools, targets, target_dir, file_path.name)
+                pending = await pools.run(file_path, host.mover.move, file_path, dest, None, st)
+                if pending is not None:
+                    await asyncio.wrap_future(pending)
+            except Exception as e:
+                print("[WARN] Failed to move", file_path, "->", target_dir, e)
+                counts["skipped"] += 1
+                continue
+            if category is None:
+                counts["review"] += 1
+                review_entries[str(file_path)] = {
+                    "review_path": str(dest),
+                    "predicted": predicted,
+                    "confidence": conf,
+                    "time": datetime.now().isoformat()
+                }
+            else:
+                counts["moved"] += 1
+                files_moved[str(file_path)] = str(dest)
+
+    async def drain(q, tasks):
+        for _ in tasks:
+            await q.put(None)
+        await asyncio.gather(*tasks)
+
+    workers = pools.size(os.path.join(directory, ""))
+    stat_tasks = [asyncio.create_task(stater()) for _ in range(workers)]
+    classify_tasks = [asyncio.create_task(classifier()) for _ in range(CLASSIFY_TASKS)]
+    move_tasks = [asyncio.create_task(mover()) for _ in range(workers)]
+    try:
+        for entry in await pools.run(os.path.join(directory, ""), _list_files, directory):
+            await stat_q.put(entry)
+        await drain(stat_q, stat_tasks)
+        await drain(classify_q, classify_tasks)
+        await drain(move_q, move_tasks)
+    finally:
+        for task in stat_tasks + classify_tasks + move_tasks:
+            task.cancel()
+        ml_pool.shutdown(wait=False)
+        if own_pools:
+            pools.close()
+
+    if not dry_run:
+        host._save_logs(files_moved, review_entries)
+    summary = dict(counts, duplicates=0)
+    return (dry_run_results if dry_run else None), summary
+
+
+# ======== DUPLICATE SCAN ========
+def _list_dir(directory):
+    names, subdirs = [], []
+    with os.scandir(directory) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    names.append(entry.name)
+            except OSError:
+                continue
+    return names, subdirs
+
+
+def _stat(path):
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+async def scan_async(folder, recursive=True, service=None, pools=None, progress=None, cancelled=None):
+    """Asynchronous ``DedupService.scan``: DuplicateGroups, or None if ``cancelled()``.
+
+    Directories are listed and their files stat'ed concurrently by a fixed
+    set of tasks fed through queues (the stat queue is bounded, so a huge
+    directory never has more than ``QUEUE_DEPTH`` stats pending), then files
+    with colliding sizes are hashed (through ``service``'s digest cache).
+    """
+    own_pools = pools is None
+    if own_pools:
+        pools = MountPools()
+    store = FileRecordStore()
+    digests = service.digests if service is not None else None
+    throttle = service.throttle if service is not None else None
+
+    dir_q = asyncio.Queue()  # directory paths only, like the stack of scan_records
+    stat_q = asyncio.Queue(QUEUE_DEPTH)
+
+    def stopped():
+        return cancelled is not None and cancelled()
+
+    async def lister():
+        while True:
+            directory = await dir_q.get()
+            try:
+                if not stopped():
+                    names, subdirs = await pools.run(os.path.join(directory, ""), _list_dir, directory)
+                    if recursive:
+                        for d in subdirs:
+                            dir_q.put_nowait(d)
+                    dir_idx = store.intern_dir(directory) if names else None
+                    for name in names:
+                        await stat_q.put((dir_idx, os.path.join(directory, name), name))
+            except Exception:
+                pass  # unreadable directory; a dead lister would stall dir_q.join()
+            finally:
+                dir_q.task_done()
+
+    async def stater():
+        while (item := await stat_q.get()) is not None:
+            dir_idx, path, name = item
+            if stopped():
+                continue
+            st = await pools.run(path, _stat, path)
+            if st is not None:
+                store.add(dir_idx, name, st)
+
+    def hash_one(i):
+        key = store.identity(i)
+        digest = digests.get(key) if digests is not None else None
+        if digest is None:
+            if throttle is not None:
+                throttle.files()
+            digest = bytes.fromhex(hash_file(store.path(i), throttle=throttle))
+            if digests is not None:
+                digests.put(key, digest)
+        store.set_digest(i, digest)
+        return i
+
+    workers = pools.size(os.path.join(folder, ""))
+    list_tasks = [asyncio.create_task(lister()) for _ in range(workers)]
+    stat_tasks = [asyncio.create_task(stater()) for _ in range(workers)]
+    try:
+        dir_q.put_nowait(folder)
+        await dir_q.join()
+        for _ in stat_tasks:
+            await stat_q.put(None)
+        await asyncio.gather(*stat_tasks)
+        if stopped():
+            return None
+
+        candidates = store.colliding_sizes()
+        hashed = []
+        step = max(1, pools.size(os.path.join(folder, ""))) * 4
+        for start in range(0, len(candidates), step):
+            if stopped():
+                return None
+            chunk = candidates[start:start + step]
+            results = await asyncio.gather(*(pools.run(store.path(i), hash_one, i) for i in chunk),
+                                           return_exceptions=True)
+            hashed.extend(r for r in results if not isinstance(r, BaseException))
+            if progress is not None:
+                progress(start + len(chunk), len(candidates))
+    finally:
+        for task in list_tasks + stat_tasks:
+            task.cancel()
+        if own_pools:
+            pools.close()
+    return DuplicateGroups(store, store.group(hashed))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Organize or scan folders on high-latency mounts.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    organize = sub.add_parser("organize", help="organize a folder with the async pipeline")
+    organize.add_argument("directory")
+    organize.add_argument("--dry-run", action="store_true")
+    scan = sub.add_parser("scan", help="find duplicate files with the async pipeline")
+    scan.add_argument("folder")
+    scan.add_argument("--no-recursive", action="store_true")
+    for command in (organize, scan):
+        command.add_argument("--concurrency", type=int, default=None,
+                             help="requests in flight per mount (default: mount_concurrency or %d)"
+                                  % DEFAULT_CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    if args.command == "organize":
+        from FileZen import config
+        pools = MountPools(config["mount_concurrency"], args.concurrency or DEFAULT_CONCURRENCY)
+        try:
+            results, summary = asyncio.run(organize_async(args.directory, args.dry_run, pools=pools))
+        finally:
+            pools.close()
+        for row in results or []:
+            print(*row, sep="\t")
+        print(summary)
+    else:
+        pools = MountPools(default=args.concurrency or DEFAULT_CONCURRENCY)
+        try:
+            groups = asyncio.run(scan_async(args.folder, not args.no_recursive, pools=pools))
+        finally:
+            pools.close()
+        for digest, paths in groups.sorted_groups():
+            print(digest)
+            for p in paths:
+                print("   ", p)
+        print(f"{len(groups)} duplicate groups")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+# filezen_benchmark.py
+"""Headless benchmarks for organize_files and duplicate scanning.
+
+Each scale runs in a fresh interpreter (so peak RSS is per scale) against
+fixture trees generated by data.py in tmpfs when available:
+
+    python filezen_benchmark.py --scales 1000,100000 --out bench.json
+    python filezen_benchmark.py --compare old.json bench.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+DEFAULT_SCALES = "1000,100000"
+DEFAULT_MAX_SIZE = 64 * 1024
+
+
+def fixture_root():
+    """Prefer tmpfs so the numbers measure FileZen rather than the disk."""
+    shm = "/dev/shm"
+    if os.path.isdir(shm) and os.access(shm, os.W_OK):
+        return shm
+    return tempfile.gettempdir()
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+@contextmanager
+def timed(phases, name):
+    """Record wall time, throughput and peak RSS of a phase into ``phases``.
+
+    The body fills in ``files``/``bytes`` on the yielded dict.
+    """
+    stats = {"files": 0, "bytes": 0}
+    start = time.perf_counter()
+    yield stats
+    seconds = time.perf_counter() - start
+    stats["seconds"] = round(seconds, 6)
+    stats["files_per_s"] = round(stats["files"] / seconds, 1) if seconds else None
+    stats["mb_per_s"] = round(stats["bytes"] / seconds / 1e6, 2) if seconds else None
+    stats["peak_rss_kb"] = peak_rss_kb()
+    phases[name] = stats
+
+
+# ======== ONE SCALE ========
+def run_scale(scale, duplicate_ratio, size_dist, max_size, seed, root):
+    import data
+    import FileZen
+    import filezen_dedup
+    from filezen_metrics import Metrics
+
+    work = tempfile.mkdtemp(prefix=f"filezen-bench-{scale}-", dir=root)
+    inbox = os.path.join(work, "inbox")
+    tree = os.path.join(work, "tree")
+    phases = {}
+    metrics = Metrics()  # per-call breakdown of the duplicate scan (hash) and latency histograms
+    try:
+        with timed(phases, "fixture") as p:
+            sinks = [data.TreeMaterializer(inbox, flat=True, seed=seed),
+                     data.TreeMaterializer(tree, duplicate_ratio=duplicate_ratio, seed=seed)]
+            for batch in data.generate_rows(scale, seed=seed, size_range=(1, max_size),
+                                            size_dist=size_dist):
+                for sink in sinks:
+                    sink.write(batch)
+            p["files"] = scale
+
+        # ---- organize: the real organize_files, broken down by its own metrics ----
+        inbox_bytes = sum(entry.stat().st_size for entry in os.scandir(inbox) if entry.is_file())
+        # no background hashing of the inbox competing with the scan phases below
+        FileZen.config["dedup_warm_after_organize"] = False
+        cwd = os.getcwd()
+        os.chdir(work)  # keep the run's log, undo and index files out of the caller's folder
+        try:
+            with timed(phases, "organize") as p:
+                _, summary = FileZen.organize_files(inbox, metrics=Metrics())
+                p["files"] = summary["moved"] + summary["review"] + summary["duplicates"]
+                p["bytes"] = inbox_bytes
+        finally:
+            os.chdir(cwd)
+        for name, stats in summary["metrics"]["phases"].items():
+            phases[f"organize.{name}"] = dict(stats, files_per_s=None)
+
+        # ---- duplicate scan: walk -> hash -> group ----
+        with timed(phases, "scan_walk") as p:
+            paths = filezen_dedup.list_files(tree)
+            p["files"] = len(paths)
+
+        scan_bytes = sum(os.path.getsize(x) for x in paths)
+        with timed(phases, "hash") as p:
+            hash_map = filezen_dedup.hash_files(paths, metrics=metrics)
+            p["files"] = len(paths)
+            p["bytes"] = scan_bytes
+
+        with timed(phases, "group") as p:
+            groups = filezen_dedup.group_duplicates(hash_map)
+            p["files"] = sum(len(files) for _, files in groups)
+
+        # same scan through the compact record store with the size prefilter,
+        # then again with the service's digest cache warm
+        service = filezen_dedup.DedupService()
+        with timed(phases, "records") as p:
+            record_groups = service.scan(tree)
+            p["files"] = len(record_groups.store)
+            p["bytes"] = scan_bytes
+
+        with timed(phases, "rescan") as p:
+            rescan = service.scan(tree)
+            p["files"] = len(rescan.store)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    return {
+        "scale": scale,
+        "duplicate_ratio": duplicate_ratio,
+        "size_dist": size_dist,
+        "max_size": max_size,
+        "seed": seed,
+        "ml_model": FileZen.ml_model is not None,
+        "duplicate_groups": len(groups),
+        "record_groups": len(record_groups),
+        "organize_summary": {k: v for k, v in summary.items() if k != "metrics"},
+        "phases": phases,
+        "detail": metrics.to_dict(),
+    }
+
+
+# ======== DRIVER ========
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_all(scales, duplicate_ratio, size_dist, max_size, seed, root):
+    results = []
+    for scale in scales:
+        print(f"[BENCH] {scale} files ...", flush=True)
+        fd, result_path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", str(scale),
+                            "--duplicate-ratio", str(duplicate_ratio), "--size-dist", size_dist,
+                            "--max-size", str(max_size), "--seed", str(seed), "--root", root,
+                            "--out", result_path], check=True)
+            with open(result_path) as f:
+                results.append(json.load(f))
+        finally:
+            os.remove(result_path)
+    return {
+        "meta": {
+            "time": datetime.now().isoformat(),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "fixture_root": root,
+        },
+        "results": results,
+    }
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = {r["scale"]: r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = {r["scale"]: r for r in json.load(f)["results"]}
+    print(f"{'scale':>9} {'phase':<18} {'old s':>10} {'new s':>10} {'speedup':>8}")
+    for scale in sorted(old.keys() & new.keys()):
+        for phase, stats in new[scale]["phases"].items():
+            before = old[scale]["phases"].get(phase)
+            if not before:
+                continue
+            speedup = before["seconds"] / stats["seconds"] if stats["seconds"] else float("inf")
+            print(f"{scale:>9} {phase:<18} {before['seconds']:>10.3f} {stats['seconds']:>10.3f} {speedup:>7.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark FileZen organizing and duplicate scanning.")
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help="comma separated file counts")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1)
+    parser.add_argument("--size-dist", choices=["uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--max-size", type=int, default=DEFAULT_MAX_SIZE)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--root", default=None, help="where fixtures are created (default: tmpfs)")
+    parser.add_argument("--out", default="filezen_benchmark.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    root = args.root or fixture_root()
+    if args.worker is not None:
+        result = run_scale(args.worker, args.duplicate_ratio, args.size_dist, args.max_size,
+                           args.seed, root)
+        with open(args.out, "w") as f:
+            json.dump(result, f)
+        return
+
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    report = run_all(scales, args.duplicate_ratio, args.size_dist, args.max_size, args.seed, root)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    for r in report["results"]:
+        for phase, stats in r["phases"].items():
+            print(f"{r['scale']:>9} {phase:<18} {stats['seconds']:>9.3f}s {stats['files_per_s'] or 0:>12.0f} files/s")
+    print(f"[BENCH] results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
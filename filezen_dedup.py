@@ -0,0 +1,621 @@
+# filezen_dedup.py
+"""Duplicate detection engine behind the FileZen duplicate finder.
+
+Kept free of Qt so it can also run headless (benchmarks, command line tools).
+``DedupService`` is the in-process API: FileZen and the duplicate finder
+window share one instance and with it a warm digest cache.
+
+For duplicates spread over several machines each node writes a sorted index
+shard, and the shards are merged into global duplicate groups:
+
+    python filezen_dedup.py shard /srv/data -o node1.fzi
+    python filezen_dedup.py merge node1.fzi node2.fzi -o groups.jsonl
+"""
+import os
+import json
+import time
+import heapq
+import socket
+import struct
+import hashlib
+import argparse
+import itertools
+import tempfile
+import threading
+from array import array
+from collections import Counter, OrderedDict, defaultdict
+from collections.abc import Mapping
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+from filezen_metrics import NULL_METRICS
+
+HASH_CHUNK_SIZE = 1024 * 1024
+DIGEST_SIZE = 32
+DIGEST_CACHE_ENTRIES = 200_000
+
+
+def list_files(folder, recursive=True, metrics=NULL_METRICS):
+    """Return the paths of all files in ``folder`` (and below if ``recursive``)."""
+    with metrics.phase("walk"):
+        all_files = _list_files(folder, recursive)
+    metrics.count("files_listed", len(all_files))
+    return all_files
+
+
+def _list_files(folder, recursive):
+    all_files = []
+    if recursive:
+        for root, _, files in os.walk(folder):
+            for f in files:
+                all_files.append(os.path.join(root, f))
+    else:
+        for f in os.listdir(folder):
+            full = os.path.join(folder, f)
+            if os.path.isfile(full):
+                all_files.append(full)
+    return all_files
+
+
+def hash_file(path, chunk_size=HASH_CHUNK_SIZE, metrics=NULL_METRICS, throttle=None):
+    """SHA-256 hex digest of the file content.
+
+    ``throttle`` (a ``filezen_io.Throttle``) paces the reads and may drop the
+    file from the page cache afterwards.
+    """
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        if throttle is None:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                hasher.update(chunk)
+                metrics.count("bytes_hashed", len(chunk))
+        else:
+            while True:
+                started = time.perf_counter()
+                chunk = f.read(chunk_size)
+                throttle.observe(time.perf_counter() - started)
+                if not chunk:
+                    break
+                throttle.bytes(len(chunk))
+                hasher.update(chunk)
+                metrics.count("bytes_hashed", len(chunk))
+            throttle.done_with(f.fileno())
+    return hasher.hexdigest()
+
+
+def safe_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+def hash_files(paths, progress=None, cancelled=None, metrics=NULL_METRICS, throttle=None):
+    """Hash ``paths`` into {digest: [paths]}; unreadable files are skipped.
+
+    ``progress(idx, total)`` is called after each file; hashing stops early
+    (returning None) once ``cancelled()`` returns True.
+    """
+    hash_map = defaultdict(list)
+    total = len(paths)
+    with metrics.profile():
+        for idx, path in enumerate(paths, 1):
+            if cancelled is not None and cancelled():
+                return None
+            file_start = metrics.clock()
+            if throttle is not None:
+                throttle.files()
+            try:
+                with metrics.phase("hash"):
+                    hash_map[hash_file(path, metrics=metrics, throttle=throttle)].append(path)
+                metrics.count("files_hashed")
+            except Exception:
+                metrics.count("hash_errors")
+            metrics.observe("file", file_start)
+            if progress is not None:
+                progress(idx, total)
+    return hash_map
+
+
+def group_duplicates(hash_map, metrics=NULL_METRICS):
+    """[(digest, paths oldest first)] for every digest shared by several files."""
+    with metrics.phase("group"):
+        if isinstance(hash_map, DuplicateGroups):
+            return hash_map.sorted_groups()  # mtimes are already in the store
+        return [(h, sorted(paths, key=safe_mtime)) for h, paths in hash_map.items() if len(paths) > 1]
+
+
+# ======== RECORD STORE ========
+class FileRecordStore:
+    """Scan results for millions of files in flat columns instead of objects.
+
+    Directories are interned once, names live in one byte buffer, digests are
+    raw 32-byte SHA-256 values and size/mtime/inode are ``array`` columns,
+    which is roughly 100 bytes per file. Paths are only rebuilt on demand.
+    """
+
+    def __init__(self):
+        self.dirs = []
+        self._dir_index = {}
+        self.dir_idx = array("I")
+        self.name_end = array("Q")
+        self.names = bytearray()
+        self.size = array("Q")
+        self.mtime_ns = array("q")
+        self.inode = array("Q")
+        self.device = array("Q")
+        self.digests = bytearray()
+
+    def __len__(self):
+        return len(self.size)
+
+    def intern_dir(self, directory):
+        idx = self._dir_index.get(directory)
+        if idx is None:
+            idx = self._dir_index[directory] = len(self.dirs)
+            self.dirs.append(directory)
+        return idx
+
+    def add(self, dir_idx, name, st):
+        self.dir_idx.append(dir_idx)
+        self.names += os.fsencode(name)
+        self.name_end.append(len(self.names))
+        self.size.append(st.st_size)
+        self.mtime_ns.append(st.st_mtime_ns)
+        self.inode.append(st.st_ino)
+        self.device.append(st.st_dev)
+        self.digests += bytes(DIGEST_SIZE)
+
+    def name(self, i):
+        start = self.name_end[i - 1] if i else 0
+        return os.fsdecode(bytes(self.names[start:self.name_end[i]]))
+
+    def path(self, i):
+        return os.path.join(self.dirs[self.dir_idx[i]], self.name(i))
+
+    def digest(self, i):
+        return bytes(self.digests[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE])
+
+    def set_digest(self, i, digest):
+        self.digests[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE] = digest
+
+    def identity(self, i):
+        """DigestCache key of record ``i``."""
+        return self.device[i], self.inode[i], self.size[i], self.mtime_ns[i]
+
+    def colliding_sizes(self):
+        """Indices of files whose size is shared with another file, in inode order.
+
+        A file with a unique size cannot have a duplicate, so it is never
+        read; inode order keeps the reads roughly sequential on disk.
+        """
+        if np is not None:
+            sizes = np.frombuffer(self.size, dtype=np.uint64)
+            _, inverse, counts = np.unique(sizes, return_inverse=True, return_counts=True)
+            idx = np.nonzero(counts[inverse] > 1)[0]
+            inodes = np.frombuffer(self.inode, dtype=np.uint64)[idx]
+            return idx[np.argsort(inodes, kind="stable")].tolist()
+        counts = Counter(self.size)
+        idx = [i for i, size in enumerate(self.size) if counts[size] > 1]
+        return sorted(idx, key=self.inode.__getitem__)
+
+    def group(self, indices):
+        """Sort ``indices`` by digest and return the runs of two or more as lists."""
+        if not indices:
+            return []
+        if np is not None:
+            words = np.frombuffer(self.digests, dtype=">u8").reshape(-1, DIGEST_SIZE // 8)
+            idx = np.asarray(indices, dtype=np.int64)
+            keys = words[idx]
+            order = np.lexsort(keys.T[::-1])
+            keys, idx = keys[order], idx[order]
+            starts = np.concatenate(([True], np.any(keys[1:] != keys[:-1], axis=1)))
+            bounds = np.append(np.nonzero(starts)[0], len(idx))
+            return [idx[a:b].tolist() for a, b in zip(bounds[:-1], bounds[1:]) if b - a > 1]
+        runs = (list(run) for _, run in itertools.groupby(sorted(indices, key=self.digest), key=self.digest))
+        return [run for run in runs if len(run) > 1]
+
+
+def scan_records(folder, recursive=True, progress=None, cancelled=None, metrics=NULL_METRICS,
+                 throttle=None, digests=None):
+    """Walk ``folder`` into a FileRecordStore and hash files with colliding sizes.
+
+    Digests found in ``digests`` (a DigestCache) are reused instead of
+    reading the file again, and fresh ones are added to it.
+    Returns (store, groups of record indices), or None if ``cancelled()``.
+    """
+    store = FileRecordStore()
+    with metrics.phase("walk"):
+        stack = [folder]
+        while stack:
+            directory = stack.pop()
+            dir_idx = None
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if recursive:
+                                    stack.append(entry.path)
+                            elif entry.is_file():
+                                if dir_idx is None:
+                                    dir_idx = store.intern_dir(directory)
+                                store.add(dir_idx, entry.name, entry.stat())
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+    metrics.count("files_listed", len(store))
+
+    candidates = store.colliding_sizes()
+    metrics.count("files_size_unique", len(store) - len(candidates))
+    hashed = array("I")
+    total = len(candidates)
+    with metrics.profile():
+        for n, i in enumerate(candidates, 1):
+            if cancelled is not None and cancelled():
+                return None
+            file_start = metrics.clock()
+            key = store.identity(i)
+            digest = digests.get(key) if digests is not None else None
+            try:
+                if digest is None:
+                    if throttle is not None:
+                        throttle.files()
+                    with metrics.phase("hash"):
+                        digest = bytes.fromhex(hash_file(store.path(i), metrics=metrics, throttle=throttle))
+                    metrics.count("files_hashed")
+                    if digests is not None:
+                        digests.put(key, digest)
+                else:
+                    metrics.count("digest_cache_hits")
+                store.set_digest(i, digest)
+                hashed.append(i)
+            except Exception:
+                metrics.count("hash_errors")
+            metrics.observe("file", file_start)
+            if progress is not None:
+                progress(n, total)
+
+    with metrics.phase("group"):
+        groups = store.group(hashed)
+    return store, groups
+
+
+class DuplicateGroups(Mapping):
+    """Read-only {hex digest: [paths oldest first]} view over a FileRecordStore.
+
+    Lets code written for the old ``hash_map`` dict keep working. Groups are
+    kept as one flat index array in digest order, looked up by bisection,
+    and paths are only built for the group being looked at.
+    """
+
+    def __init__(self, store, groups):
+        self.store = store
+        self._members = array("I")
+        self._bounds = array("Q", [0])
+        for members in groups:  # FileRecordStore.group yields digest order
+            self._members.extend(sorted(members, key=store.mtime_ns.__getitem__))
+            self._bounds.append(len(self._members))
+
+    def _digest(self, k):
+        return self.store.digest(self._members[self._bounds[k]])
+
+    def _indices(self, digest):
+        try:
+            raw = bytes.fromhex(digest)
+        except (TypeError, ValueError):
+            raise KeyError(digest) from None
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._digest(mid) < raw:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == len(self) or self._digest(lo) != raw:
+            raise KeyError(digest)
+        return self._members[self._bounds[lo]:self._bounds[lo + 1]]
+
+    def __getitem__(self, digest):
+        return [self.store.path(i) for i in self._indices(digest)]
+
+    def __iter__(self):
+        return (self._digest(k).hex() for k in range(len(self)))
+
+    def __len__(self):
+        return len(self._bounds) - 1
+
+    def sizes(self, digest):
+        return [self.store.size[i] for i in self._indices(digest)]
+
+    def sorted_groups(self):
+        return [(h, self[h]) for h in self]
+
+
+# ======== SERVICE ========
+def stat_identity(st):
+    """DigestCache key for an ``os.stat_result``."""
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class DigestCache:
+    """Thread-safe LRU of raw digests keyed by (st_dev, st_ino, size, mtime_ns).
+
+    The key survives renames, so files the organizer moved are still known
+    to the next duplicate scan.
+    """
+
+    def __init__(self, max_entries=DIGEST_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            digest = self._entries.get(key)
+            if digest is not None:
+                self._entries.move_to_end(key)
+            return digest
+
+    def put(self, key, digest):
+        with self._lock:
+            self._entries[key] = digest
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class DedupService:
+    """In-process duplicate finding API shared by the organizer and the finder window.
+
+    Holds the digest cache and the shared I/O throttle, so a rescan re-reads
+    nothing that has not changed, even after organizing renamed it. Organizing
+    hands over the stats of the files it moved (``warm``): those sharing a
+    size are hashed in the background, so a duplicate scan right after
+    organizing finds their digests cached.
+    """
+
+    def __init__(self, throttle=None, cache_entries=DIGEST_CACHE_ENTRIES):
+        self.throttle = throttle
+        self.digests = DigestCache(cache_entries)
+        self._warm_lock = threading.Lock()
+
+    def scan(self, folder, recursive=True, progress=None, cancelled=None, metrics=NULL_METRICS):
+        """DuplicateGroups for ``folder``, or None if ``cancelled()``."""
+        result = scan_records(folder, recursive, progress, cancelled, metrics, self.throttle,
+                              self.digests)
+        return None if result is None else DuplicateGroups(*result)
+
+    def cached_digest(self, st):
+        """Hex digest for a stat result if it is already known, else None."""
+        digest = self.digests.get(stat_identity(st))
+        return None if digest is None else digest.hex()
+
+    def remember(self, path, digest):
+        """Record the known hex ``digest`` of ``path`` (e.g. a verified copy)."""
+        self.digests.put(stat_identity(os.stat(path)), bytes.fromhex(digest))
+
+    def warm(self, files):
+        """Hash the ``(path, stat)`` pairs whose sizes collide on a background thread.
+
+        Uses the stats the caller already has (no new walk); files that
+        changed since are skipped. Returns the thread, or None if there is
+        nothing to hash.
+        """
+        by_size = defaultdict(list)
+        for path, st in files:
+            by_size[st.st_size].append((path, st))
+        todo = [(path, st) for group in by_size.values() if len(group) > 1 for path, st in group
+                if self.digests.get(stat_identity(st)) is None]
+        if not todo:
+            return None
+        thread = threading.Thread(target=self._warm, args=(todo,), name="filezen-dedup-warm",
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    def _warm(self, todo):
+        with self._warm_lock:
+            for path, st in todo:
+                try:
+                    if stat_identity(os.stat(path)) == stat_identity(st):
+                        self.digest(path, st)
+                except OSError:
+                    continue
+
+    def digest(self, path, st=None, metrics=NULL_METRICS):
+        """Hex digest of ``path``, hashed only on a cache miss."""
+        st = st or os.stat(path)
+        key = stat_identity(st)
+        digest = self.digests.get(key)
+        if digest is None:
+            with metrics.phase("hash"):
+                digest = bytes.fromhex(hash_file(path, metrics=metrics, throttle=self.throttle))
+            self.digests.put(key, digest)
+        return digest.hex()
+
+
+# ======== INDEX SHARDS ========
+# A shard is a header (magic, node name) followed by records sorted by
+# (size, digest, path): 8-byte size, 32-byte raw SHA-256, 4-byte path length
+# and the path as file-system bytes.
+SHARD_MAGIC = b"FZI1"
+_RECORD = struct.Struct(">Q32sI")
+_NODE_LEN = struct.Struct(">H")
+SHARD_RUN_RECORDS = 1_000_000
+
+
+def _write_records(path, node, records):
+    node_raw = node.encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(SHARD_MAGIC + _NODE_LEN.pack(len(node_raw)) + node_raw)
+        for size, digest, raw_path in records:
+            f.write(_RECORD.pack(size, digest, len(raw_path)))
+            f.write(raw_path)
+
+
+def read_shard(path):
+    """Return (node, iterator of (size, digest, raw path)) for a shard file."""
+    f = open(path, "rb", buffering=1024 * 1024)
+    if f.read(len(SHARD_MAGIC)) != SHARD_MAGIC:
+        f.close()
+        raise ValueError(f"{path} is not a FileZen index shard")
+    node = f.read(_NODE_LEN.unpack(f.read(_NODE_LEN.size))[0]).decode("utf-8")
+
+    def records():
+        with f:
+            while True:
+                head = f.read(_RECORD.size)
+                if not head:
+                    return
+                size, digest, length = _RECORD.unpack(head)
+                yield size, digest, f.read(length)
+
+    return node, records()
+
+
+def _walk_stats(folder, recursive):
+    """Yield (path, stat) for files under ``folder`` without listing them all first."""
+    stack = [folder]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive:
+                                stack.append(entry.path)
+                        elif entry.is_file():
+                            yield entry.path, entry.stat()
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+
+def write_shard(folder, out_path, node=None, recursive=True, run_records=SHARD_RUN_RECORDS,
+                progress=None, metrics=NULL_METRICS, throttle=None):
+    """Hash every file under ``folder`` into a sorted shard at ``out_path``.
+
+    The tree is walked as it is hashed and at most ``run_records`` records
+    are held in memory; larger scans are spilled as sorted runs and merged,
+    so memory stays bounded. ``progress(idx, None)`` is called after each
+    file (the total is not known while streaming).
+    Returns the number of records written.
+    """
+    node = node or socket.gethostname()
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    runs = []
+    buf = []
+    count = 0
+    try:
+        for idx, (path, st) in enumerate(_walk_stats(os.path.abspath(folder), recursive), 1):
+            metrics.count("files_listed")
+            size = st.st_size
+            try:
+                with metrics.phase("hash"):
+                    digest = bytes.fromhex(hash_file(path, metrics=metrics, throttle=throttle))
+            except OSError:
+                metrics.count("hash_errors")
+                continue
+            buf.append((size, digest, os.fsencode(path)))
+            count += 1
+            if len(buf) >= run_records:
+                fd, run = tempfile.mkstemp(suffix=".fzi-run", dir=out_dir)
+                os.close(fd)
+                runs.append(run)
+                buf.sort()
+                _write_records(run, node, buf)
+                buf = []
+            if progress is not None:
+                progress(idx, None)
+
+        buf.sort()
+        if not runs:
+            _write_records(out_path, node, buf)
+        else:
+            streams = [read_shard(run)[1] for run in runs]
+            _write_records(out_path, node, heapq.merge(buf, *streams))
+    finally:
+        for run in runs:
+            os.remove(run)
+    return count
+
+
+def iter_global_groups(shard_paths):
+    """Yield (size, hex digest, [(node, path)]) for digests found more than once.
+
+    Shards are combined with a streaming k-way merge; only one group is held
+    in memory at a time.
+    """
+    def tagged(shard):
+        node, records = read_shard(shard)
+        for size, digest, raw in records:
+            yield size, digest, node, raw
+
+    streams = [tagged(shard) for shard in shard_paths]
+    merged = heapq.merge(*streams)
+    for (size, digest), items in itertools.groupby(merged, key=lambda r: (r[0], r[1])):
+        files = [(node, os.fsdecode(raw)) for _, _, node, raw in items]
+        if len(files) > 1:
+            yield size, digest.hex(), files
+
+
+def merge_shards(shard_paths, out_path):
+    """Write global duplicate groups as JSON lines; return the number of groups."""
+    groups = 0
+    with open(out_path, "w", encoding="utf-8") as f:
+        for size, digest, files in iter_global_groups(shard_paths):
+            f.write(json.dumps({"size": size, "digest": digest, "files": files}) + "\n")
+            groups += 1
+    return groups
+
+
+def load_merged_groups(path, local_node=None):
+    """Read a merged index into {digest: [paths]}.
+
+    Paths from this machine are returned as-is; paths from other nodes are
+    shown as ``node:path`` (they cannot be previewed or moved from here).
+    """
+    local_node = local_node or socket.gethostname()
+    hash_map = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            group = json.loads(line)
+            hash_map[group["digest"]] = [p if n == local_node else f"{n}:{p}" for n, p in group["files"]]
+    return hash_map
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and merge FileZen duplicate index shards.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    shard = sub.add_parser("shard", help="scan a folder into a sorted index shard")
+    shard.add_argument("folder")
+    shard.add_argument("-o", "--out", required=True)
+    shard.add_argument("--node", default=None, help="node name (default: host name)")
+    shard.add_argument("--no-recursive", action="store_true")
+    merge = sub.add_parser("merge", help="merge shards into global duplicate groups (JSON lines)")
+    merge.add_argument("shards", nargs="+")
+    merge.add_argument("-o", "--out", required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == "shard":
+        count = write_shard(args.folder, args.out, args.node, not args.no_recursive)
+        print(f"Indexed {count} files into {args.out}")
+    else:
+        groups = merge_shards(args.shards, args.out)
+        print(f"Found {groups} duplicate groups across {len(args.shards)} shards -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,17 @@
 import os
 import io
-import hashlib
-import shutil
-from collections import defaultdict
+import asyncio
 from datetime import datetime
 
 from PyQt5 import QtWidgets, QtGui, QtCore
 from PIL import Image
 
+from filezen_dedup import (hash_file, group_duplicates, safe_mtime, load_merged_groups, DuplicateGroups,
+                           DedupService)
+from filezen_io import MoveEngine, lower_priority
+from filezen_async import MountPools, scan_async, uses_async_io
+from filezen_metrics import NULL_METRICS
+
 try:
     import PyPDF2
 except Exception:
@@ -22,50 +26,41 @@ except Exception:
 # ---------------- Worker Thread ----------------
 class ScanWorker(QtCore.QThread):
     progress = QtCore.pyqtSignal(int, int)
-    finished = QtCore.pyqtSignal(dict)
+    finished = QtCore.pyqtSignal(object)
     cancelled = QtCore.pyqtSignal()
 
-    def __init__(self, folder, recursive=True):
+    def __init__(self, folder, recursive=True, metrics=NULL_METRICS, service=None, io_config=None):
         super().__init__()
         self.folder = folder
         self.recursive = recursive
+        self.metrics = metrics
+        self.service = service or DedupService()
+        self.io_config = io_config or {}
         self._cancel = False
 
     def run(self):
-        hash_map = defaultdict(list)
-        all_files = []
-        # collect file list first
-        if self.recursive:
-            for root, _, files in os.walk(self.folder):
-                for f in files:
-                    all_files.append(os.path.join(root, f))
-        else:
-            for f in os.listdir(self.folder):
-                full = os.path.join(self.folder, f)
-                if os.path.isfile(full):
-                    all_files.append(full)
-
-        total = len(all_files)
-        for idx, path in enumerate(all_files, 1):
-            if self._cancel:
-                self.cancelled.emit()
-                return
+        # nice/ioprio are per thread: only this scan is deprioritized, not the UI
+        lower_priority(self.io_config)
+        # compact records; only files sharing a size with another file are hashed,
+        # and digests already in the service's cache are not read again
+        if uses_async_io(self.folder, self.io_config):
+            # high-latency mount: keep many stat/read requests in flight
+            pools = MountPools(self.io_config.get("mount_concurrency"))
             try:
-                h = self.hash_file(path)
-                if h:
-                    hash_map[h].append(path)
-            except Exception:
-                pass
-            self.progress.emit(idx, total)
-
-        self.finished.emit(hash_map)
+                result = asyncio.run(scan_async(self.folder, self.recursive, self.service, pools,
+                                                progress=self.progress.emit, cancelled=lambda: self._cancel))
+            finally:
+                pools.close()
+        else:
+            result = self.service.scan(self.folder, self.recursive, progress=self.progress.emit,
+                                       cancelled=lambda: self._cancel, metrics=self.metrics)
+        if result is None:
+            self.cancelled.emit()
+            return
+        self.finished.emit(result)
 
     def hash_file(self, path):
-        hasher = hashlib.sha256()
-        with open(path, "rb") as f:
-            for chunk in iter(lambda: f.read(8192), b""):
-                hasher.update(chunk)
-        return hasher.hexdigest()
+        return hash_file(path)
 
     def cancel(self):
         self._cancel = True
@@ -73,12 +68,15 @@ class ScanWorker(QtCore.QThread):
 
 # ---------------- Main App ----------------
 class FileZen(QtWidgets.QWidget):
-    def __init__(self):
+    def __init__(self, service=None, io_config=None):
         super().__init__()
+        # FileZen passes its own service so digests are shared with the organizer
+        self.service = service or DedupService()
+        self.io_config = io_config or {}
         self.setWindowTitle("FileZen – Duplicate Finder")
         self.resize(1000, 650)
 
-        self.hash_map = defaultdict(list)
+        self.hash_map = {}
         self.groups = []
         self.keep_selection = {}
         self.scan_root = None
@@ -156,13 +154,16 @@ class FileZen(QtWidgets.QWidget):
         self.btn_scan = QtWidgets.QPushButton("📂  Scan Folder")
         self.btn_scan.clicked.connect(self.scan_folder)
 
+        self.btn_index = QtWidgets.QPushButton("🗂  Open Index")
+        self.btn_index.clicked.connect(self.open_index)
+
         self.btn_auto = QtWidgets.QPushButton("🕒  Auto-Select Latest")
         self.btn_auto.clicked.connect(self.auto_select_latest)
 
         self.btn_move = QtWidgets.QPushButton("📦  Move Duplicates")
         self.btn_move.clicked.connect(self.move_duplicates)
 
-        for btn in (self.btn_scan, self.btn_auto, self.btn_move):
+        for btn in (self.btn_scan, self.btn_index, self.btn_auto, self.btn_move):
             btn.setFixedHeight(36)
             btn.setStyleSheet("""
                 QPushButton {
@@ -180,6 +181,7 @@ class FileZen(QtWidgets.QWidget):
 
         btn_h.addWidget(self.btn_scan)
         btn_h.addWidget(self.include_sub)
+        btn_h.addWidget(self.btn_index)
         btn_h.addWidget(self.btn_auto)
         btn_h.addWidget(self.btn_move)
         right_v.addLayout(btn_h)
@@ -213,7 +215,7 @@ class FileZen(QtWidgets.QWidget):
 
         recursive = self.include_sub.isChecked()
         self.scan_root = folder
-        self.hash_map.clear()
+        self.hash_map = {}
         self.groups = []
         self.group_list.clear()
         self.table.clearContents()
@@ -255,7 +257,7 @@ class FileZen(QtWidgets.QWidget):
         vbox.addWidget(progress)
         vbox.addWidget(cancel_btn)
 
-        self.worker = ScanWorker(folder, recursive)
+        self.worker = ScanWorker(folder, recursive, service=self.service, io_config=self.io_config)
         self.worker.progress.connect(lambda i, total: (
             progress.setValue(int(i / total * 100) if total else 0),
             label.setText(f"Scanning {i} / {total} files...")
@@ -265,11 +267,40 @@ class FileZen(QtWidgets.QWidget):
 
         cancel_btn.clicked.connect(lambda: self.worker.cancel())
         self.worker.start()
-        dlg.exec_()
+        # open() instead of exec_(): no nested event loop, so a host (the
+        # FileZen Tk window pumping Qt events) keeps responding during a scan
+        dlg.open()
+
+    def open_index(self):
+        """Load global duplicate groups merged from index shards (filezen_dedup.py merge)."""
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Open merged duplicate index", "",
+                                                        "Duplicate index (*.jsonl);;All files (*)")
+        if not path:
+            return
+        try:
+            result = load_merged_groups(path)
+        except (OSError, ValueError) as e:
+            QtWidgets.QMessageBox.warning(self, "Open Index", f"Could not read {path}:\n{e}")
+            return
+
+        self.scan_root = None
+        self.hash_map = {}
+        self.groups = []
+        self.keep_selection.clear()
+        self.group_list.clear()
+        self.table.clearContents()
+        self.table.setRowCount(0)
+        self.preview_label.setText("Preview will appear here.")
+        self.on_scan_complete(result)
+
+    def closeEvent(self, event):
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.cancel()
+        super().closeEvent(event)
 
     def on_scan_complete(self, result):
         self.hash_map = result
-        self.groups = [(h, sorted(paths, key=lambda p: os.path.getmtime(p))) for h, paths in result.items() if len(paths) > 1]
+        self.groups = group_duplicates(result)
 
         for idx, (h, files) in enumerate(self.groups, 1):
             ext = os.path.splitext(files[0])[1].upper() or "FILE"
@@ -286,6 +317,10 @@ class FileZen(QtWidgets.QWidget):
             return
         file_hash = sel.data(QtCore.Qt.UserRole)
         files = self.hash_map.get(file_hash, [])
+        # record-store results carry sizes from the scan, no need to stat again
+        sizes = None
+        if isinstance(self.hash_map, DuplicateGroups) and file_hash in self.hash_map:
+            sizes = self.hash_map.sizes(file_hash)
 
         self.table.blockSignals(True)
         self.table.setRowCount(0)
@@ -298,7 +333,8 @@ class FileZen(QtWidgets.QWidget):
             self.table.setItem(r, 0, chk_item)
 
             name_item = QtWidgets.QTableWidgetItem(os.path.basename(path))
-            size_item = QtWidgets.QTableWidgetItem(str(self.human_size_kb(path)))
+            size_kb = round(sizes[r] / 1024, 2) if sizes else self.human_size_kb(path)
+            size_item = QtWidgets.QTableWidgetItem(str(size_kb))
             path_item = QtWidgets.QTableWidgetItem(path)
             path_item.setFlags(path_item.flags() & ~QtCore.Qt.ItemIsEditable)
 
@@ -330,7 +366,7 @@ class FileZen(QtWidgets.QWidget):
         for h, files in self.groups:
             if not files:
                 continue
-            latest = max(files, key=lambda p: os.path.getmtime(p))
+            latest = max(files, key=safe_mtime)
             self.keep_selection[h] = latest
         self.load_group()
         QtWidgets.QMessageBox.information(self, "Auto-Select Done", "Latest files have been auto-selected.")
@@ -394,20 +430,31 @@ class FileZen(QtWidgets.QWidget):
 
     # ---------------- move duplicates ----------------
     def move_duplicates(self):
-        if not self.scan_root:
+        if not self.groups:
             QtWidgets.QMessageBox.warning(self, "No scan", "Please scan a folder first.")
             return
+        target = self.scan_root
+        if not target:
+            # Groups from a merged index span several folders (and machines).
+            target = QtWidgets.QFileDialog.getExistingDirectory(self, "Select where to put duplicates")
+            if not target:
+                return
     
-        dup_root = os.path.join(self.scan_root, "Duplicate_Files")
+        dup_root = os.path.join(target, "Duplicate_Files")
         os.makedirs(dup_root, exist_ok=True)
     
         moved, errors = 0, []
+        # Digests are known from the scan, so cross-device copies are verified for free.
+        mover = MoveEngine(verify=True, throttle=self.service.throttle, service=self.service)
+        in_flight = []
     
         for h, files in self.groups:
-            keeps = [self.keep_selection.get(h)] if h in self.keep_selection else [max(files, key=lambda p: os.path.getmtime(p))]
+            keeps = [self.keep_selection.get(h)] if h in self.keep_selection else [max(files, key=safe_mtime)]
             for f in files:
                 if f in keeps:
                     continue
+                if self.scan_root is None and not os.path.isfile(f):
+                    continue  # lives on another node of a merged index
                 dst = os.path.join(dup_root, os.path.basename(f))
                 base, ext = os.path.splitext(dst)
                 i = 1
@@ -415,13 +462,25 @@ class FileZen(QtWidgets.QWidget):
                     dst = f"{base}__dup{i}{ext}"
                     i += 1
                 try:
-                    shutil.move(f, dst)
-                    moved += 1
+                    pending = mover.move(f, dst, digest=h)
                 except Exception as e:
                     errors.append((f, str(e)))
+                    continue
+                if pending is None:
+                    moved += 1
+                else:
+                    in_flight.append((f, pending))
+
+        for f, pending in in_flight:
+            try:
+                pending.result()
+                moved += 1
+            except Exception as e:
+                errors.append((f, str(e)))
+        mover.close()
     
         # UI cleanup
-        self.hash_map.clear()
+        self.hash_map = {}
         self.groups.clear()
         self.keep_selection.clear()
         self.scan_root = None
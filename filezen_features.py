@@ -0,0 +1,68 @@
+# filezen_features.py
+"""Feature extraction shared by train_filezen_model.py and FileZen.py.
+
+The trained pipeline pickles references to the functions below, so they must
+stay importable under this module name for ``joblib.load`` to work.
+All transformers are stateless, which keeps training streamable.
+"""
+import numpy as np
+from scipy import sparse
+from sklearn.compose import ColumnTransformer
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import FunctionTransformer
+
+FEATURE_COLUMNS = ["filename", "extension", "size"]
+
+FILENAME_FEATURES = 2 ** 18
+EXTENSION_FEATURES = 2 ** 12
+SIZE_BINS = 48  # log2 buckets: 1 byte .. 128 TiB
+
+
+def _is_missing(value):
+    return value is None or value != value  # None or NaN
+
+
+def normalize_filenames(values):
+    return ["" if _is_missing(v) else str(v).lower() for v in values]
+
+
+def normalize_extensions(values):
+    """'.PDF', 'pdf' and 'pdf ' all map to 'pdf'; empty becomes 'unknown'."""
+    out = []
+    for v in values:
+        ext = "" if _is_missing(v) else str(v).strip().lower().lstrip(".")
+        out.append(ext or "unknown")
+    return out
+
+
+def size_bins(X):
+    """One-hot log2 size bucket for a single ``size`` column."""
+    sizes = np.nan_to_num(np.asarray(X, dtype=float).reshape(-1), nan=0.0)
+    bins = np.clip(np.log2(np.maximum(sizes, 0) + 1).astype(int), 0, SIZE_BINS - 1)
+    rows = np.arange(len(bins))
+    return sparse.csr_matrix((np.ones(len(bins)), (rows, bins)), shape=(len(bins), SIZE_BINS))
+
+
+def build_features(filename_features=FILENAME_FEATURES):
+    """Sparse features: char n-grams of the name, hashed extension, size bucket."""
+    filename = make_pipeline(
+        FunctionTransformer(normalize_filenames),
+        HashingVectorizer(analyzer="char_wb", ngram_range=(2, 4), n_features=filename_features,
+                          alternate_sign=False, lowercase=False),
+    )
+    # One token per row, hashed into its own small space: a one-hot encoding
+    # that needs no vocabulary, so unseen extensions do not break streaming.
+    extension = make_pipeline(
+        FunctionTransformer(normalize_extensions),
+        HashingVectorizer(token_pattern=r"\S+", n_features=EXTENSION_FEATURES,
+                          alternate_sign=False, lowercase=False, norm=None),
+    )
+    return ColumnTransformer(
+        [
+            ("filename", filename, "filename"),
+            ("extension", extension, "extension"),
+            ("size", FunctionTransformer(size_bins), ["size"]),
+        ],
+        sparse_threshold=1.0,
+    )
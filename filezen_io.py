@@ -0,0 +1,396 @@
+# filezen_io.py
+"""File moving engine shared by the organizer and the duplicate finder.
+
+Same-device moves are a plain ``rename``. Cross-device moves are detected up
+front and copied in the kernel (``copy_file_range``, then ``sendfile``, then
+a ``pread``/``write`` loop) into a ``.filezen-part`` file that survives
+interruptions and is resumed on the next attempt. Metadata is preserved,
+the copy can be verified against a known digest before the source is
+removed, and large files are copied on a separate, bounded worker lane so
+they do not hold up the many small moves behind them.
+
+A shared ``Throttle`` caps the bytes/s and files/s of all hashing and moving
+workers so full scans leave bandwidth to co-located services.
+"""
+import os
+import sys
+import json
+import time
+import errno
+import shutil
+import platform
+import threading
+import ctypes
+import ctypes.util
+from concurrent.futures import ThreadPoolExecutor
+
+from filezen_dedup import hash_file
+from filezen_metrics import NULL_METRICS
+
+PART_SUFFIX = ".filezen-part"
+PART_SOURCE_SUFFIX = ".src"  # sidecar of a part file: identity of the file being copied
+COPY_CHUNK = 64 * 1024 * 1024
+THROTTLED_CHUNK = 1024 * 1024  # finer steps keep a rate limit smooth
+LARGE_FILE_BYTES = 256 * 1024 * 1024
+LARGE_FILE_WORKERS = 2
+
+# errnos meaning "this copy primitive is not usable here", not "the copy failed"
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSOCK, errno.EBADF}
+
+
+class VerificationError(OSError):
+    pass
+
+
+# ======== THROTTLING ========
+class TokenBucket:
+    """Thread-safe token bucket refilled at ``rate`` tokens per second.
+
+    ``consume`` may overdraw the bucket; the caller then sleeps off the debt,
+    so requests larger than the burst size are still paced correctly.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, n=1):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= n
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class Throttle:
+    """I/O budget shared by every hashing and moving worker.
+
+    With ``adaptive`` the configured rates are scaled down (multiplicative
+    decrease) while the moving average of read/copy latencies exceeds
+    ``target_latency`` seconds, and crept back up once the device recovers.
+    ``drop_cache`` asks the kernel to evict pages of files read in full.
+    """
+
+    def __init__(self, bytes_per_s=None, files_per_s=None, adaptive=False, target_latency=0.05,
+                 drop_cache=False):
+        self.byte_bucket = TokenBucket(bytes_per_s) if bytes_per_s else None
+        self.file_bucket = TokenBucket(files_per_s) if files_per_s else None
+        self.base_rates = (bytes_per_s, files_per_s)
+        self.adaptive = adaptive
+        self.target_latency = target_latency
+        self.drop_cache = drop_cache
+        self.factor = 1.0
+        self._latency = None
+
+    def files(self, n=1):
+        if self.file_bucket is not None:
+            self.file_bucket.consume(n)
+
+    def bytes(self, n):
+        if self.byte_bucket is not None:
+            self.byte_bucket.consume(n)
+
+    def observe(self, seconds):
+        """Feed the latency of one read/copy call into the adaptive controller."""
+        if not self.adaptive:
+            return
+        ewma = seconds if self._latency is None else 0.8 * self._latency + 0.2 * seconds
+        self._latency = ewma
+        if ewma > self.target_latency:
+            factor = max(0.05, self.factor * 0.7)
+        elif ewma < self.target_latency / 2:
+            factor = min(1.0, self.factor + 0.02)
+        else:
+            return
+        if factor != self.factor:
+            self.factor = factor
+            for bucket, base in zip((self.byte_bucket, self.file_bucket), self.base_rates):
+                if bucket is not None:
+                    bucket.rate = base * factor
+
+    def done_with(self, fd):
+        """Drop a fully read file from the page cache (if ``drop_cache``)."""
+        if self.drop_cache and hasattr(os, "posix_fadvise"):
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            except OSError:
+                pass
+
+
+def throttle_from_config(cfg):
+    """Build the shared Throttle from FileZen's ``io_*`` config keys (None if unused)."""
+    bytes_per_s = cfg.get("io_bytes_per_s")
+    files_per_s = cfg.get("io_files_per_s")
+    drop_cache = cfg.get("io_drop_cache", False)
+    if not (bytes_per_s or files_per_s or drop_cache):
+        return None
+    return Throttle(bytes_per_s, files_per_s, cfg.get("io_adaptive", False),
+                    cfg.get("io_target_latency_ms", 50) / 1000, drop_cache)
+
+
+# ======== PRIORITY ========
+IOPRIO_CLASS_BE = 2
+IOPRIO_CLASS_IDLE = 3
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+_SYS_IOPRIO_SET = {"x86_64": 251, "aarch64": 30, "i386": 289, "i686": 289, "armv7l": 314,
+                   "ppc64le": 273, "s390x": 282, "riscv64": 30}
+
+
+def set_io_priority(ioclass=IOPRIO_CLASS_IDLE, level=7):
+    """ioprio_set() for the calling thread; returns False where unsupported."""
+    nr = _SYS_IOPRIO_SET.get(platform.machine())
+    if not sys.platform.startswith("linux") or nr is None:
+        return False
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    return libc.syscall(nr, _IOPRIO_WHO_PROCESS, 0, (ioclass << _IOPRIO_CLASS_SHIFT) | level) == 0
+
+
+def lower_priority(cfg):
+    """Apply the ``io_nice``/``io_idle_priority`` config keys to the calling thread.
+
+    On Linux both settings are per thread, so calling this from a worker
+    thread leaves the UI thread at normal priority.
+    """
+    if cfg.get("io_nice"):
+        try:
+            os.nice(cfg["io_nice"])
+        except (AttributeError, OSError):
+            pass
+    if cfg.get("io_idle_priority"):
+        set_io_priority(IOPRIO_CLASS_IDLE)
+
+
+# ======== COPY ========
+def _copy_bytes(infd, outfd, offset, size, progress=None, throttle=None):
+    use_copy_file_range = hasattr(os, "copy_file_range")
+    use_sendfile = hasattr(os, "sendfile")
+    start = offset
+    while offset < size:
+        n = min(COPY_CHUNK if throttle is None else THROTTLED_CHUNK, size - offset)
+        started = time.perf_counter()
+        if use_copy_file_range:
+            try:
+                sent = os.copy_file_range(infd, outfd, n, offset, offset)
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+                use_copy_file_range = False
+                continue
+        elif use_sendfile:
+            try:
+                os.lseek(outfd, offset, os.SEEK_SET)
+                sent = os.sendfile(outfd, infd, offset, n)
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+                use_sendfile = False
+                continue
+        else:
+            data = os.pread(infd, n, offset)
+            os.lseek(outfd, offset, os.SEEK_SET)
+            sent = os.write(outfd, data)
+        if sent == 0:
+            # Some filesystem/kernel pairs report "nothing copied" instead of
+            # an error; only trust a 0 as EOF once a primitive has made progress.
+            if offset == start and use_copy_file_range:
+                use_copy_file_range = False
+                continue
+            if offset == start and use_sendfile:
+                use_sendfile = False
+                continue
+            raise OSError(errno.EIO, "Source file shrank while copying")
+        if throttle is not None:
+            throttle.observe(time.perf_counter() - started)
+            throttle.bytes(sent)
+        offset += sent
+        if progress is not None:
+            progress(offset, size)
+
+
+def _source_identity(st):
+    return [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+def _part_source(part):
+    try:
+        with open(part + PART_SOURCE_SUFFIX) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def remove_part(part):
+    for path in (part, part + PART_SOURCE_SUFFIX):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def copy_file(src, dest, progress=None, resume=True, throttle=None):
+    """Copy ``src`` to ``dest + PART_SUFFIX`` and return the part path.
+
+    An existing part file is resumed from where it stopped when ``resume``
+    and its sidecar shows it was copied from this very source (same device,
+    inode, size and mtime); any other part file is started over.
+    Mode, timestamps, xattrs and (where permitted) ownership are copied.
+    """
+    part = dest + PART_SUFFIX
+    st = os.stat(src)
+    identity = _source_identity(st)
+    offset = 0
+    if resume and os.path.exists(part) and _part_source(part) == identity:
+        offset = min(os.path.getsize(part), st.st_size)
+    flags = os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0)
+    if not offset:
+        flags |= os.O_TRUNC
+        with open(part + PART_SOURCE_SUFFIX, "w") as f:
+            json.dump(identity, f)
+
+    infd = os.open(src, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        outfd = os.open(part, flags, 0o600)
+        try:
+            os.ftruncate(outfd, offset)
+            _copy_bytes(infd, outfd, offset, st.st_size, progress, throttle)
+            os.fsync(outfd)
+            if throttle is not None:
+                throttle.done_with(outfd)
+                throttle.done_with(infd)
+        finally:
+            os.close(outfd)
+    finally:
+        os.close(infd)
+
+    shutil.copystat(src, part)
+    try:
+        os.chown(part, st.st_uid, st.st_gid)
+    except (AttributeError, OSError):
+        pass
+    return part
+
+
+# ======== MOVE ========
+def move_file(src, dest, verify=False, digest=None, progress=None, cross_device=None,
+              throttle=None):
+    """Move ``src`` to ``dest`` (which must not exist yet); return ``dest``.
+
+    ``cross_device`` skips the rename attempt when already known. With
+    ``verify`` the copy is checked against ``digest`` (SHA-256 hex, e.g. from
+    a duplicate scan) or a fresh hash of the source before the source is
+    unlinked.
+    """
+    src, dest = str(src), str(dest)
+    if not cross_device:
+        try:
+            os.replace(src, dest)
+            return dest
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+    if os.path.isdir(src):
+        return shutil.move(src, dest)
+
+    part = copy_file(src, dest, progress, throttle=throttle)
+    if verify:
+        expected = digest or hash_file(src, throttle=throttle)
+        if hash_file(part, throttle=throttle) != expected:
+            remove_part(part)
+            raise VerificationError(errno.EIO, "Copy does not match source", src)
+    os.replace(part, dest)
+    remove_part(part)
+    os.remove(src)
+    return dest
+
+
+class MoveEngine:
+    """Routes moves: renames and small copies inline, large copies to a lane.
+
+    ``move`` returns None once an inline move is done, or a Future for a
+    move handed to the large-file lane. The destination name is reserved
+    with an empty placeholder until the lane finishes, so later moves do not
+    pick the same name.
+
+    With a ``service`` (``filezen_dedup.DedupService``) verified copies use
+    digests it already knows and teach it the digest of the new copy.
+    """
+
+    def __init__(self, verify=False, large_file_bytes=LARGE_FILE_BYTES,
+                 large_file_workers=LARGE_FILE_WORKERS, metrics=NULL_METRICS, throttle=None,
+                 service=None):
+        self.verify = verify
+        self.throttle = throttle
+        self.service = service
+        self.large_file_bytes = large_file_bytes
+        self.large_file_workers = large_file_workers
+        self.metrics = metrics
+        self._devices = {}
+        self._lane = None
+        self._lock = threading.Lock()
+
+    def _device(self, directory):
+        dev = self._devices.get(directory)
+        if dev is None:
+            dev = self._devices[directory] = os.stat(directory).st_dev
+        return dev
+
+    def is_cross_device(self, src_stat, dest):
+        return src_stat.st_dev != self._device(os.path.dirname(str(dest)))
+
+    def move(self, src, dest, digest=None, src_stat=None):
+        src, dest = str(src), str(dest)
+        if self.throttle is not None:
+            self.throttle.files()
+        st = src_stat or os.stat(src)
+        cross = self.is_cross_device(st, dest)
+        if cross:
+            self.metrics.count("cross_device_moves")
+            self.metrics.count("bytes_copied", st.st_size)
+            if self.verify and digest is None and self.service is not None:
+                digest = self.service.cached_digest(st)
+        if not cross or st.st_size < self.large_file_bytes:
+            move_file(src, dest, self.verify, digest, cross_device=cross, throttle=self.throttle)
+            if cross:
+                self._remember(dest, digest)
+            return None
+
+        with open(dest, "xb"):
+            pass  # placeholder, replaced atomically by the finished copy
+        with self._lock:
+            if self._lane is None:
+                self._lane = ThreadPoolExecutor(max_workers=self.large_file_workers,
+                                                thread_name_prefix="filezen-large")
+        return self._lane.submit(self._move_large, src, dest, digest)
+
+    def _move_large(self, src, dest, digest):
+        try:
+            move_file(src, dest, self.verify, digest, cross_device=True, throttle=self.throttle)
+            self._remember(dest, digest)
+            return dest
+        except Exception:
+            try:
+                if os.path.getsize(dest) == 0:
+                    os.remove(dest)
+            except OSError:
+                pass
+            raise
+
+    def _remember(self, dest, digest):
+        # a rename keeps the cache key valid by itself; a copy gets a new inode
+        if self.service is not None and self.verify and digest:
+            try:
+                self.service.remember(dest, digest)
+            except OSError:
+                pass
+
+    def close(self):
+        if self._lane is not None:
+            self._lane.shutdown(wait=True)
+            self._lane = None
@@ -0,0 +1,255 @@
+# filezen_metadata.py
+"""Header-only metadata for organizing by date and author.
+
+Only what is needed to file a document is read: the EXIF block of a photo
+(no pixel decode), the trailer/Info dictionary of a PDF (pages stay
+unloaded) and ``docProps/core.xml`` of a DOCX. Results are cached per
+(st_dev, st_ino, st_mtime_ns) and can be fetched ahead on a thread pool, so
+organizing with path templates stays close to extension-only speed:
+
+    ex = MetadataExtractor()
+    for entry in ex.read_ahead(entries, wanted):            # a bounded window ahead
+        render_path("IMAGES/{year}/{month}", ex.get(entry.path, entry.stat()))
+"""
+import os
+import re
+import string
+import zipfile
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from xml.etree import ElementTree
+
+try:
+    from PIL import Image
+except Exception:
+    Image = None
+
+try:
+    import PyPDF2
+except Exception:
+    PyPDF2 = None
+
+DEFAULT_WORKERS = 4
+CACHE_ENTRIES = 100_000
+READ_AHEAD = 256  # entries listed ahead of the one being organized
+UNKNOWN = "Unknown"
+FIELDS = ("year", "month", "day", "author")
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".tif", ".tiff", ".png", ".webp"}
+
+_EXIF_IFD = 0x8769
+_EXIF_DATETIME_ORIGINAL = 36867
+_EXIF_DATETIME = 306
+_EXIF_ARTIST = 315
+
+_CORE_NS = {
+    "dc": "http://purl.org/dc/elements/1.1/",
+    "dcterms": "http://purl.org/dc/terms/",
+}
+
+_DATE = re.compile(r"(\d{4})[:\-]?(\d{2})?[:\-]?(\d{2})?")
+_UNSAFE = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+# ======== READERS ========
+def _parse_date(value):
+    """(year, month, day) from EXIF "2023:07:14 ...", PDF "D:20230714..." or ISO dates."""
+    if not value:
+        return None
+    m = _DATE.search(str(value))
+    if not m or m.group(1) == "0000":
+        return None
+    return m.group(1), m.group(2) or "01", m.group(3) or "01"
+
+
+def read_image(path):
+    # Image.open only parses the header; getexif() does not decode pixels,
+    # except for PNG when the eXIf chunk follows the image data (Pillow then
+    # loads the whole image to reach it), so such PNGs fall back to the mtime.
+    with Image.open(path) as img:
+        if img.format == "PNG" and "exif" not in img.info:
+            return None, None
+        exif = img.getexif()
+        taken = exif.get_ifd(_EXIF_IFD).get(_EXIF_DATETIME_ORIGINAL) or exif.get(_EXIF_DATETIME)
+        return _parse_date(taken), exif.get(_EXIF_ARTIST)
+
+
+def read_pdf(path):
+    # PdfReader reads the xref table and trailer; pages are loaded on access only.
+    with open(path, "rb") as f:
+        info = PyPDF2.PdfReader(f, strict=False).metadata or {}
+        return _parse_date(info.get("/CreationDate")), info.get("/Author")
+
+
+def read_docx(path):
+    with zipfile.ZipFile(path) as z:
+        root = ElementTree.fromstring(z.read("docProps/core.xml"))
+    created = root.findtext("dcterms:created", namespaces=_CORE_NS)
+    author = root.findtext("dc:creator", namespaces=_CORE_NS)
+    return _parse_date(created), author
+
+
+def _reader_for(ext):
+    if ext in IMAGE_EXTENSIONS and Image is not None:
+        return read_image
+    if ext == ".pdf" and PyPDF2 is not None:
+        return read_pdf
+    if ext == ".docx":
+        return read_docx
+    return None
+
+
+def _safe_name(value):
+    value = _UNSAFE.sub("_", str(value)).strip(" .")
+    return value or UNKNOWN
+
+
+def extract(path, st):
+    """Template fields for ``path``: year, month, day and author.
+
+    Dates fall back to the modification time and the author to "Unknown"
+    when a file carries no (readable) metadata.
+    """
+    date, author = None, None
+    reader = _reader_for(os.path.splitext(path)[1].lower())
+    if reader is not None:
+        try:
+            date, author = reader(path)
+        except Exception:
+            pass
+    if date is None:
+        mtime = datetime.fromtimestamp(st.st_mtime)
+        date = (f"{mtime.year:04d}", f"{mtime.month:02d}", f"{mtime.day:02d}")
+    year, month, day = date
+    return {"year": year, "month": month, "day": day,
+            "author": _safe_name(author) if author else UNKNOWN}
+
+
+def render_path(template, fields):
+    """Relative folder for a template such as ``"IMAGES/{year}/{month}"``."""
+    return os.path.normpath(template.format_map(fields))
+
+
+def valid_templates(templates):
+    """The entries of ``templates`` that render to a relative folder.
+
+    Templates naming an unknown field (``{camera}``), with a broken format
+    spec or escaping the organized folder are reported and dropped, so one
+    bad config value cannot abort an organize run halfway.
+    """
+    sample = dict.fromkeys(FIELDS, UNKNOWN)
+    valid = {}
+    for category, template in (templates or {}).items():
+        try:
+            names = {field for _, field, _, _ in string.Formatter().parse(template) if field}
+            unknown = names - set(FIELDS)
+            if unknown:
+                raise KeyError(", ".join(sorted(unknown)))
+            rendered = render_path(template, sample)
+        except (KeyError, ValueError, IndexError, TypeError, AttributeError) as e:
+            print(f"[WARN] Ignoring path template for {category} ({template!r}): {e!r}")
+            continue
+        if os.path.isabs(rendered) or rendered.split(os.sep)[0] == os.pardir:
+            print(f"[WARN] Ignoring path template for {category} ({template!r}): outside the folder")
+            continue
+        valid[category] = template
+    return valid
+
+
+# ======== EXTRACTOR ========
+class MetadataExtractor:
+    """Thread-pooled ``extract`` with a bounded per-(device, inode, mtime) cache."""
+
+    def __init__(self, workers=DEFAULT_WORKERS, cache_entries=CACHE_ENTRIES):
+        self.workers = workers
+        self.cache_entries = cache_entries
+        self._cache = OrderedDict()  # key -> fields dict or Future
+        self._lock = threading.Lock()
+        self._pool = None
+
+    @staticmethod
+    def _key(st):
+        return st.st_dev, st.st_ino, st.st_mtime_ns
+
+    def prefetch(self, path, st):
+        """Start reading ``path`` in the background unless it is cached; return the cache key."""
+        key = self._key(st)
+        with self._lock:
+            if key in self._cache:
+                return key
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                                thread_name_prefix="filezen-metadata")
+            self._store(key, self._pool.submit(extract, path, st))
+        return key
+
+    def _forget(self, key):
+        """Drop a prefetch nobody asked for (the file was skipped)."""
+        with self._lock:
+            value = self._cache.get(key)
+            if value is not None and not isinstance(value, dict):
+                value.cancel()
+                del self._cache[key]
+
+    def read_ahead(self, entries, wanted, ahead=READ_AHEAD):
+        """Yield ``entries``, prefetching those ``wanted(entry)`` up to ``ahead`` entries early.
+
+        Only the window is held in memory and queued on the pool, however
+        large the directory is.
+        """
+        window = deque()
+
+        def release():
+            entry, key = window.popleft()
+            yield entry
+            if key is not None:
+                self._forget(key)
+
+        for entry in entries:
+            key = None
+            try:
+                if wanted(entry):
+                    key = self.prefetch(entry.path, entry.stat())
+            except OSError:
+                pass
+            window.append((entry, key))
+            if len(window) > ahead:
+                yield from release()
+        while window:
+            yield from release()
+
+    def get(self, path, st):
+        """Template fields for ``path``, waiting for a prefetch if one is running."""
+        key = self._key(st)
+        with self._lock:
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache.move_to_end(key)
+        if value is None:
+            value = extract(path, st)
+        elif not isinstance(value, dict):
+            value = value.result()
+        with self._lock:
+            self._store(key, value)
+        return value
+
+    def _store(self, key, value):
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_entries:
+            # Evict the oldest result; prefetches stay until get() collects
+            # them (read_ahead bounds how many there are), so no file is
+            # read twice.
+            for old, cached in self._cache.items():
+                if isinstance(cached, dict):
+                    break
+            else:
+                return
+            del self._cache[old]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
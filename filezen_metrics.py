@@ -0,0 +1,137 @@
+# filezen_metrics.py
+"""Opt-in phase timers, counters and latency histograms for FileZen's hot loops.
+
+Code paths take a ``metrics`` argument and default to ``NULL_METRICS``,
+whose probes are empty methods, so instrumentation costs next to nothing
+unless a real ``Metrics`` is passed in:
+
+    m = Metrics()
+    organize_files(folder, metrics=m)
+    m.write_json("organize_metrics.json")
+"""
+import sys
+import json
+import time
+import cProfile
+from contextlib import contextmanager, nullcontext
+
+_NULL_CONTEXT = nullcontext()
+
+
+class _Phase:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    enabled = True
+
+    def __init__(self, profile=False, hook=None):
+        self.phases = {}        # name -> [seconds, calls]
+        self.counters = {}      # name -> int
+        self.histograms = {}    # name -> {bucket upper bound (us): count}
+        self._profiler = cProfile.Profile() if profile else None
+        self._hook = hook       # optional sys.setprofile callback
+
+    # ---------------- probes ----------------
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def add_time(self, name, seconds):
+        entry = self.phases.get(name)
+        if entry is None:
+            self.phases[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def clock(self):
+        return time.perf_counter()
+
+    def observe(self, name, start):
+        """Add the time since ``start`` (from ``clock()``) to histogram ``name``."""
+        micros = (time.perf_counter() - start) * 1e6
+        bucket = 1 << max(0, int(micros)).bit_length()  # power-of-two upper bound
+        hist = self.histograms.setdefault(name, {})
+        hist[bucket] = hist.get(bucket, 0) + 1
+
+    @contextmanager
+    def profile(self):
+        """Run the enclosed hot loop under cProfile and/or the sys.setprofile hook."""
+        if self._hook is not None:
+            previous = sys.getprofile()
+            sys.setprofile(self._hook)
+        if self._profiler is not None:
+            self._profiler.enable()
+        try:
+            yield
+        finally:
+            if self._profiler is not None:
+                self._profiler.disable()
+            if self._hook is not None:
+                sys.setprofile(previous)
+
+    # ---------------- output ----------------
+    def to_dict(self):
+        return {
+            "phases": {name: {"seconds": round(t, 6), "calls": n} for name, (t, n) in self.phases.items()},
+            "counters": dict(self.counters),
+            "histograms_us": {name: {f"<={b}": c for b, c in sorted(hist.items())}
+                              for name, hist in self.histograms.items()},
+        }
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def write_profile(self, path):
+        if self._profiler is not None:
+            self._profiler.dump_stats(path)
+
+
+class _NullMetrics:
+    enabled = False
+
+    def phase(self, name):
+        return _NULL_CONTEXT
+
+    def add_time(self, name, seconds):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def clock(self):
+        return 0.0
+
+    def observe(self, name, start):
+        pass
+
+    def profile(self):
+        return _NULL_CONTEXT
+
+    def to_dict(self):
+        return {}
+
+    def write_json(self, path):
+        pass
+
+    def write_profile(self, path):
+        pass
+
+
+NULL_METRICS = _NullMetrics()
@@ -0,0 +1,240 @@
+# filezen_watch.py
+"""Watch mode: organize files as soon as they land in a folder.
+
+Uses inotify on Linux and falls back to polling elsewhere. New files are
+debounced until they are closed (inotify) or unchanged between two polls,
+then handed to ``organize_files`` in small batches so they go through the
+same rule/ML pipeline, logs and undo file as a manual run.
+
+    python filezen_watch.py ~/Downloads
+"""
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import argparse
+import ctypes
+import ctypes.util
+
+from FileZen import organize_files, config
+from filezen_io import lower_priority
+
+DEFAULT_DEBOUNCE = 0.3
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_POLL_INTERVAL = 1.0
+
+# Names written by browsers/download managers while a transfer is running.
+PARTIAL_SUFFIXES = (".part", ".crdownload", ".partial")
+
+# ======== INOTIFY ========
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _wanted(name):
+    return not name.lower().endswith(PARTIAL_SUFFIXES)
+
+
+def _list_files(directory):
+    names = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.is_file() and _wanted(entry.name):
+                names.append(entry.name)
+    return names
+
+
+def _signature(directory, name):
+    try:
+        st = os.stat(os.path.join(directory, name))
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _settled_files(directory, debounce):
+    """Files already in ``directory`` that stayed unchanged for ``debounce`` seconds.
+
+    Anything still being written is left out; the watcher reports it once it
+    is closed (inotify) or stops changing (polling).
+    """
+    before = {name: _signature(directory, name) for name in _list_files(directory)}
+    time.sleep(debounce)
+    cutoff = time.time_ns() - int(debounce * 1e9)
+    settled = []
+    for name, sig in before.items():
+        if sig is not None and _signature(directory, name) == sig and sig[1] <= cutoff:
+            settled.append(name)
+    return settled
+
+
+class InotifyWatcher:
+    """Reports files that were closed after writing or moved into ``directory``."""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.directory = directory
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF
+        if self._add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, os.strerror(err), directory)
+
+    def wait(self, timeout):
+        """Block up to ``timeout`` seconds (forever if None); return changed names."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        names = []
+        offset = 0
+        while offset < len(buf):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size
+            raw = buf[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped; fall back to a full listing.
+                names.extend(_list_files(self.directory))
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                raise FileNotFoundError(errno.ENOENT, "Watched folder went away", self.directory)
+            elif raw and not mask & IN_ISDIR:
+                name = os.fsdecode(raw)
+                if _wanted(name):
+                    names.append(name)
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Reports files whose size and mtime did not change between two polls."""
+
+    def __init__(self, directory, interval=DEFAULT_POLL_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self._dir_mtime = None
+        self._candidates = {}
+        self._reported = {}
+
+    def wait(self, timeout):
+        if timeout is None or timeout > self.interval:
+            timeout = self.interval
+        time.sleep(timeout)
+
+        # Nothing new in the folder and nothing waiting to settle: skip the listing.
+        dir_mtime = os.stat(self.directory).st_mtime_ns
+        if dir_mtime == self._dir_mtime and not self._candidates:
+            return []
+        self._dir_mtime = dir_mtime
+
+        current = {}
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and _wanted(entry.name):
+                    st = entry.stat()
+                    current[entry.name] = (st.st_size, st.st_mtime_ns)
+
+        stable = []
+        candidates = {}
+        for name, sig in current.items():
+            if self._reported.get(name) == sig:
+                continue
+            if self._candidates.get(name) == sig:
+                stable.append(name)
+                self._reported[name] = sig
+            else:
+                candidates[name] = sig
+        self._candidates = candidates
+        self._reported = {n: s for n, s in self._reported.items() if n in current}
+        return stable
+
+    def close(self):
+        pass
+
+
+def make_watcher(directory, force_polling=False, poll_interval=DEFAULT_POLL_INTERVAL):
+    if not force_polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError) as e:
+            print("[WARN] inotify unavailable, polling instead:", e)
+    return PollingWatcher(directory, poll_interval)
+
+
+# ======== WATCH LOOP ========
+def watch(directory, debounce=DEFAULT_DEBOUNCE, batch_size=DEFAULT_BATCH_SIZE,
+          poll_interval=DEFAULT_POLL_INTERVAL, force_polling=False, stop_event=None):
+    """Organize ``directory`` now, then keep organizing new files until stopped."""
+    directory = os.path.abspath(directory)
+    lower_priority(config)
+    watcher = make_watcher(directory, force_polling, poll_interval)
+    print(f"[WATCH] {directory} ({type(watcher).__name__})")
+
+    initial = _settled_files(directory, debounce)
+    for i in range(0, len(initial), batch_size):
+        _, summary = organize_files(directory, files=initial[i:i + batch_size])
+        print("[WATCH] initial pass:", summary)
+
+    pending = {}
+    try:
+        while stop_event is None or not stop_event.is_set():
+            if pending:
+                timeout = max(0.0, min(pending.values()) + debounce - time.monotonic())
+            else:
+                # Block indefinitely when idle unless someone may ask us to stop.
+                timeout = None if stop_event is None else 1.0
+
+            for name in watcher.wait(timeout):
+                pending[name] = time.monotonic()
+
+            now = time.monotonic()
+            ready = [name for name, t in pending.items() if now - t >= debounce]
+            for i in range(0, len(ready), batch_size):
+                batch = ready[i:i + batch_size]
+                for name in batch:
+                    del pending[name]
+                _, summary = organize_files(directory, files=batch)
+                print(f"[WATCH] {len(batch)} file(s):", summary)
+    finally:
+        watcher.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Continuously organize files dropped into a folder.")
+    parser.add_argument("directory")
+    parser.add_argument("--poll", action="store_true", help="use polling instead of inotify")
+    parser.add_argument("--interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help="polling interval in seconds")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE,
+                        help="quiet time before a new file is organized")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+    try:
+        watch(args.directory, args.debounce, args.batch_size, args.interval, args.poll)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
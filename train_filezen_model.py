@@ -1,65 +1,104 @@
+# train_filezen_model.py
+import argparse
+
+import joblib
+import numpy as np
 import pandas as pd
-import string
-import random
-from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.naive_bayes import MultinomialNB
+from sklearn.pipeline import Pipeline
 from sklearn.metrics import classification_report, accuracy_score
 
-# -----------------------
-# Preprocess function
-# -----------------------
-def preprocess_extension(ext):
-    if pd.isna(ext):   # ✅ handle NaN safely
-        return "UNKNOWN"
-    ext = str(ext).strip().lower()
-    if ext == "":
-        return "UNKNOWN"
-    return ext
+from filezen_features import FEATURE_COLUMNS, FILENAME_FEATURES, build_features
+
+DATA_FILE = "training_data.csv"
+MODEL_FILE = "filezen_model.pkl"   # the artifact FileZen.py loads
+CHUNK_SIZE = 100_000
+HOLDOUT_EVERY = 5                  # every 5th row is kept for evaluation
 
 # -----------------------
-# Load dataset
+# Streaming input
 # -----------------------
-df = pd.read_csv("training_data.csv")
+def read_chunks(path, chunksize, usecols=None):
+    """Yield (first_row_number, DataFrame) chunks without loading the whole CSV."""
+    offset = 0
+    reader = pd.read_csv(path, chunksize=chunksize, usecols=usecols, dtype=str,
+                         keep_default_na=False)
+    for chunk in reader:
+        if "size" in chunk:
+            chunk["size"] = pd.to_numeric(chunk["size"], errors="coerce").fillna(0)
+        yield offset, chunk
+        offset += len(chunk)
 
-# Clean extension column
-df["extension"] = df["extension"].apply(preprocess_extension)
 
-# Features and labels
-X = df["extension"]   # extensions as input
-y = df["category"]    # categories as output
+def holdout_mask(offset, n, every):
+    if every <= 0:
+        return np.zeros(n, dtype=bool)
+    return (np.arange(offset, offset + n) % every) == 0
 
-# -----------------------
-# Vectorize (Bag of Words)
-# -----------------------
-vectorizer = CountVectorizer()
-X_vec = vectorizer.fit_transform(X)
 
-# -----------------------
-# Train-test split
-# -----------------------
-X_train, X_test, y_train, y_test = train_test_split(
-    X_vec, y, test_size=0.2, random_state=42, stratify=y
-)
+def collect_classes(path, chunksize):
+    classes = set()
+    for _, chunk in read_chunks(path, chunksize, usecols=["category"]):
+        classes.update(chunk["category"].unique())
+    return np.array(sorted(classes))
 
 # -----------------------
-# Train Naive Bayes Model
+# Training
 # -----------------------
-model = MultinomialNB()
-model.fit(X_train, y_train)
+def train(path=DATA_FILE, chunksize=CHUNK_SIZE, holdout_every=HOLDOUT_EVERY,
+          filename_features=FILENAME_FEATURES):
+    classes = collect_classes(path, chunksize)
+    features = build_features(filename_features)
+    model = MultinomialNB(alpha=0.1)
+    rows = 0
+
+    for offset, chunk in read_chunks(path, chunksize):
+        train_rows = chunk[~holdout_mask(offset, len(chunk), holdout_every)]
+        if train_rows.empty:
+            continue
+        if rows == 0:
+            features.fit(train_rows[FEATURE_COLUMNS])  # stateless, only records the columns
+        X = features.transform(train_rows[FEATURE_COLUMNS])
+        model.partial_fit(X, train_rows["category"], classes=classes)
+        rows += len(train_rows)
+        print(f"  trained on {rows} rows")
+
+    if rows == 0:
+        raise ValueError(f"No training rows found in {path}")
+    return Pipeline([("features", features), ("clf", model)])
 
 # -----------------------
 # Evaluation
 # -----------------------
-y_pred = model.predict(X_test)
+def evaluate(pipeline, path=DATA_FILE, chunksize=CHUNK_SIZE, holdout_every=HOLDOUT_EVERY):
+    y_true, y_pred = [], []
+    for offset, chunk in read_chunks(path, chunksize):
+        test_rows = chunk[holdout_mask(offset, len(chunk), holdout_every)]
+        if test_rows.empty:
+            continue
+        y_true.append(test_rows["category"].to_numpy())
+        y_pred.append(pipeline.predict(test_rows[FEATURE_COLUMNS]))
+    if not y_true:
+        print("No held-out rows to evaluate.")
+        return
+    y_true = np.concatenate(y_true)
+    y_pred = np.concatenate(y_pred)
+    print("✅ Accuracy:", accuracy_score(y_true, y_pred))
+    print("\n📊 Classification Report:\n", classification_report(y_true, y_pred, zero_division=0))
 
-print("✅ Accuracy:", accuracy_score(y_test, y_pred))
-print("\n📊 Classification Report:\n", classification_report(y_test, y_pred))
 
-# -----------------------
-# Save Model + Vectorizer (optional)
-# -----------------------
-import joblib
-joblib.dump(model, "file_classifier_model.pkl")
-joblib.dump(vectorizer, "vectorizer.pkl")
-print("\n🎉 Model training complete and saved!")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the FileZen file classifier.")
+    parser.add_argument("--data", default=DATA_FILE)
+    parser.add_argument("--out", default=MODEL_FILE)
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--holdout-every", type=int, default=HOLDOUT_EVERY,
+                        help="hold out every Nth row for evaluation (0 disables)")
+    parser.add_argument("--filename-features", type=int, default=FILENAME_FEATURES)
+    args = parser.parse_args()
+
+    pipeline = train(args.data, args.chunksize, args.holdout_every, args.filename_features)
+    evaluate(pipeline, args.data, args.chunksize, args.holdout_every)
+
+    joblib.dump(pipeline, args.out)
+    print(f"\n🎉 Model training complete and saved to {args.out}!")